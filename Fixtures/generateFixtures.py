@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import numpy as np
+import json
+import os
+import sys
+
+'''
+Writes the v8 chart fixtures used by benchmarkChart.py (one per common chart, named <duration>_<interval>.json)
+
+python generateFixtures.py          synthetic data, shaped like Yahoo's (the same every time)
+python generateFixtures.py --live   records the real responses from Yahoo (run from the repo's root)
+'''
+
+# name -> (chart length in days, interval)
+FIXTURES = {"1d_2m": (1, "2m"), "5d_5m": (5, "5m"), "3m_60m": (90, "60m"), "3y_1d": (3 * 365, "1d")}
+
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+MARKET_TZ = ZoneInfo("America/New_York")
+# Charts end here (a Friday, after the post-market closes)
+END = datetime(2021, 3, 5, 20, 0, tzinfo=MARKET_TZ)
+
+
+
+# sessionTimes(int length, int seconds)
+# Returns the bar timestamps Yahoo would give for the last length days (pre/post-market included for intraday bars)
+def sessionTimes(length, seconds):
+	times = []
+	day = END - timedelta(days=length - 1)
+	while day <= END:
+		if day.weekday() < 5:
+			if seconds >= 24 * 60 * 60:
+				times.append(int(day.replace(hour=9, minute=30).timestamp()))
+			else:
+				start = int(day.replace(hour=4, minute=0).timestamp())
+				times.extend(range(start, start + 16 * 60 * 60, seconds))
+		day += timedelta(days=1)
+	return times
+
+
+
+# synthetic(int length, String interval, Generator random)
+# Builds a v8-style response: a random walk, with the sparse blanks (None) Yahoo leaves in quiet bars
+def synthetic(length, interval, random):
+	seconds = {"m": 60, "d": 24 * 60 * 60}[interval[-1]] * int(interval[:-1])
+	timestamps = sessionTimes(length, seconds)
+	n = len(timestamps)
+
+	close = 300 * np.exp(np.cumsum(random.normal(0, 0.002 * np.sqrt(seconds / 60), n)))
+	spread = close * random.uniform(0, 0.002, n)
+	volume = random.lognormal(10, 1, n).astype(int)
+	blank = random.random(n) < 0.03
+
+	quote = {}
+	for key, values in [("open", close - spread), ("high", close + spread), ("low", close - 2 * spread),
+		("close", close), ("volume", volume)]:
+		quote[key] = [None if b else (round(float(v), 4) if key != "volume" else int(v)) for v, b in zip(values, blank)]
+
+	meta = {"currency": "USD", "symbol": "SPY", "dataGranularity": interval, "previousClose": 300,
+		"chartPreviousClose": 300}
+	return {"chart": {"result": [{"meta": meta, "timestamp": timestamps, "indicators": {"quote": [quote]}}],
+		"error": None}}
+
+
+
+# live(int length, String interval)
+# Records the real response from Yahoo
+def live(length, interval):
+	sys.path.append(os.path.dirname(FOLDER))
+	import generateChart as gc
+	from Utils import httpClient
+	import asyncio
+
+	async def fetch():
+		try:
+			period2 = int(datetime.now().timestamp())
+			url = gc.chartURL("SPY", period2 - length * 24 * 60 * 60, period2, interval)
+			return json.loads(await httpClient.fetchText(url))
+		finally:
+			await httpClient.close()
+	return asyncio.run(fetch())
+
+
+
+if __name__ == "__main__":
+	random = np.random.default_rng(0)
+	for name, (length, interval) in FIXTURES.items():
+		data = live(length, interval) if "--live" in sys.argv else synthetic(length, interval, random)
+		with open(os.path.join(FOLDER, name + ".json"), "w") as f:
+			json.dump(data, f)
+		print(name, len(data['chart']['result'][0].get('timestamp', [])), "bars")
@@ -0,0 +1,36 @@
+import messageParser as mp
+from dateutil import parser
+import timeit
+
+'''
+Compares parseExpiry against dateutil on the dates from real command strings
+
+Run from this folder (like the tests): python benchmarkParser.py
+'''
+
+# Commands as they're actually typed (from !op, !ops and !c)
+COMMANDS = ["$spy 6/19c 300", "AAPL 4/17p $400.50", "T 1/18/22C 2010.50", "spy 4-17c 300", "$SPY 4/17c $300",
+	"$spy 4/17C $300.00", "tsla 12/18/20c 1000", "qqq 7-2p 250", "spy 6/19", "$spy 06-19", "amd 1/15/21c 60",
+	"msft 5/1p 170", "nflx 4/24c 450.5", "spy 200619", "spx 3/20/2020p 2000"]
+
+# Pulls the date out of each command (the date is always the 2nd word, sometimes followed by the option type)
+DATES = [command.split()[1].upper().rstrip("CP") for command in COMMANDS]
+
+NUMBER = 2000
+
+
+
+def withDateutil():
+	for date in DATES:
+		parser.parse(date, tzinfos={None: 0})
+
+def withParseExpiry():
+	for date in DATES:
+		mp.parseExpiry(date)
+
+
+
+if __name__ == "__main__":
+	for name, function in [("dateutil", withDateutil), ("parseExpiry", withParseExpiry)]:
+		seconds = min(timeit.repeat(function, number=NUMBER, repeat=5))
+		print("{0:<12} {1:8.2f} us/date".format(name, seconds / (NUMBER * len(DATES)) * 1e6))
@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+import re
+import sys
+
+'''
+##############
+## OVERVIEW ##
+##############
+
+Contract(String ticker, datetime expiry, String optionType, int strike)
+	A parsed option contract (the strike is stored in mills, ie. $300.50 -> 300500)
+
+Contract.fromSymbol(String cSymbol)
+	Parses the given contract symbol (each symbol is only ever parsed once)
+
+Contract.strikeAsString()
+	Returns the strike with 3 decimals (eg. 300.000)
+
+Contract.isExpired(datetime now)
+	Checks if the contract has expired
+
+'''
+
+# ticker, YYMMDD, C/P, and the strike (in mills) padded to 8 digits
+SYMBOL_PATTERN = re.compile(r"^(\D+?)(\d{2})(\d{2})(\d{2})([CP])(\d{8})$")
+
+# symbol -> Contract
+_contracts = {}
+
+
+
+class Contract:
+	__slots__ = ("ticker", "expiry", "optionType", "strike", "symbol")
+
+	# (String ticker, datetime expiry, String optionType, int strike)
+	# A parsed option contract (the strike is stored in mills, ie. $300.50 -> 300500)
+	def __init__(self, ticker, expiry, optionType, strike):
+		self.ticker = sys.intern(ticker)
+		self.expiry = expiry
+		self.optionType = optionType
+		self.strike = strike
+		self.symbol = "{0}{1}{2}{3:08d}".format(ticker, expiry.strftime('%y%m%d'), optionType, strike)
+
+
+
+	# fromSymbol(String cSymbol)
+	# Parses the given contract symbol (each symbol is only ever parsed once)
+	@staticmethod
+	def fromSymbol(cSymbol):
+		contract = _contracts.get(cSymbol)
+		if contract is None:
+			match = SYMBOL_PATTERN.match(cSymbol.upper())
+			if match is None:
+				raise ValueError("Not a contract symbol")
+
+			ticker, year, month, day, optionType, strike = match.groups()
+			ticker = re.sub("[^a-zA-Z]", "", ticker) # removes any non-alpha characters
+			expiry = datetime(2000 + int(year), int(month), int(day), tzinfo=timezone.utc)
+			contract = Contract(ticker, expiry, optionType, int(strike))
+			_contracts[cSymbol] = contract
+		return contract
+
+
+
+	# strikeAsString()
+	# Returns the strike with 3 decimals (eg. 300.000)
+	def strikeAsString(self):
+		return "{0}.{1:03d}".format(self.strike // 1000, self.strike % 1000)
+
+
+
+	# isExpired(datetime now)
+	# Checks if the contract has expired (contracts can be traded through the end of their expiry date)
+	def isExpired(self, now=None):
+		now = datetime.now() if now is None else now
+		return self.expiry.date() < now.date()
+
+
+
+	def __str__(self):
+		return self.symbol
+
+	def __repr__(self):
+		return "Contract({0})".format(self.symbol)
+
+	def __eq__(self, other):
+		return isinstance(other, Contract) and self.symbol == other.symbol
+
+	def __hash__(self):
+		return hash(self.symbol)
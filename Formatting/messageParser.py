@@ -1,9 +1,10 @@
 # A bot for parsing text into options data
-from datetime import datetime
+from datetime import datetime, timezone
 from dateutil import parser
 import re
 import unittest
 from Formatting import stringFormat as sf
+from Formatting.contract import Contract
 
 '''
 ##############
@@ -16,12 +17,18 @@ parseContractInfo(String string)
 parseChainInfo(String string)
 	Given an option chain request, this returns the parsed ticker and date (if exists)
 
+parseExpiry(String string)
+	Parses an expiry date (eg. 4/17, 4-17, 1/18/22, 200417), only falling back to dateutil for other formats
+
 parseDurationInfo(String time, maxDur int)
 	Takes a string of the duration and converts it into an integer
 
 contractSymbolToInfo(String cSymbol)
 	Given a contract symbol, it parses it into seperate pieces of information
 
+Contract (see contract.py)
+	A parsed contract symbol, cached by symbol
+
 '''
 
 # parseContractInfo(String string)
@@ -36,7 +43,7 @@ def parseContractInfo(string):
 
 	# Cleans the ticker, date, optionType, and strike
 	ticker = re.sub('[^a-zA-Z]', '', ticker)
-	date = parser.parse(dateAndType[:-1], tzinfos={None: 0})
+	date = parseExpiry(dateAndType[:-1])
 	dateAsString = date.strftime('%y%m%d') 
 
 	optionType = dateAndType[-1:]
@@ -67,7 +74,7 @@ def parseChainInfo(string):
 	if len(split) == 1:
 		date = None
 	elif len(split) == 2:
-		date = parser.parse(split[1], tzinfos={None: 0})
+		date = parseExpiry(split[1])
 	else:
 		raise ValueError('String is not properly formatted')
 
@@ -79,6 +86,38 @@ def parseChainInfo(string):
 
 
 
+# M/D, M-D, M/D/YY, M-D-YYYY, etc.
+MONTH_DAY_PATTERN = re.compile(r"^(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2}|\d{4}))?$")
+# YYMMDD (the format used in contract symbols)
+SYMBOL_DATE_PATTERN = re.compile(r"^(\d{2})(\d{2})(\d{2})$")
+
+# parseExpiry(String string)
+# Parses an expiry date (eg. 4/17, 4-17, 1/18/22, 200417), only falling back to dateutil for other formats
+# Dates are midnight UTC (matching Yahoo's expiration timestamps)
+def parseExpiry(string):
+	match = MONTH_DAY_PATTERN.match(string)
+	try:
+		if match is not None:
+			month, day, year = match.groups()
+			if year is None:
+				year = datetime.now().year
+			elif len(year) == 2:
+				year = 2000 + int(year)
+			return datetime(int(year), int(month), int(day), tzinfo=timezone.utc)
+
+		match = SYMBOL_DATE_PATTERN.match(string)
+		if match is not None:
+			year, month, day = match.groups()
+			return datetime(2000 + int(year), int(month), int(day), tzinfo=timezone.utc)
+	except ValueError:
+		pass # Not a real date (eg. 2/30) - let dateutil have a go at it
+
+	return parser.parse(string, tzinfos={None: 0})
+
+
+
+
+
 # parseDurationInfo(String time, maxDur int)
 # Takes a string of the duration and converts it into an integer
 def parseDurationInfo(durationAsStr, maxDur=60):
@@ -94,19 +133,5 @@ def parseDurationInfo(durationAsStr, maxDur=60):
 # contractSymbolToInfo(String cSymbol)
 # Given a contract symbol, it parses it into seperate pieces of information
 def contractSymbolToInfo(cSymbol):
-	tickerAndDate = cSymbol[:-8] # Last 8 are always reserved for the strike price
-	ticker = re.sub("[^a-zA-Z]", "", tickerAndDate[:-1]) # removes any non-alpha characters
-
-	date = re.sub("[^0-9]", "", tickerAndDate)  # removes any non-numberic
-
-	dateSplit = cSymbol.split(date)[1] # splits the string on the date (ie. returns the strike)
-
-	strike = dateSplit[1:6] + "." + dateSplit[6:] # adds the decimal
-	strike = re.sub("^0+", "", strike) # strips the leading zeros
- 
-	optionType = dateSplit[0:1] # parses the option type
-
-	date = date[2:4] + "/" + date[4:] + "/20" + date[:2] # Formats the date
-	date = parser.parse(date, tzinfos={None: 0}) # Creates the datetime object
-
-	return ticker, date, optionType, strike
\ No newline at end of file
+	contract = Contract.fromSymbol(cSymbol)
+	return contract.ticker, contract.expiry, contract.optionType, contract.strikeAsString()
@@ -1,6 +1,7 @@
 import messageParser as mp
 import stringFormat as sf
 import unittest
+from datetime import datetime, timezone
 
 #########
 # TESTS #
@@ -88,6 +89,28 @@ class TestParseChainInfo(unittest.TestCase):
 		self.assertEqual(self.d1, self.d4)
 		self.assertEqual(self.d2, self.d3)
 
+class TestParseExpiry(unittest.TestCase):
+	def setUp(self):
+		self.year = datetime.now().year
+		self.d1 = mp.parseExpiry("4/17")
+		self.d2 = mp.parseExpiry("4-17")
+		self.d3 = mp.parseExpiry("1/18/22")
+		self.d4 = mp.parseExpiry("1/18/2022")
+		self.d5 = mp.parseExpiry("220118")
+		self.d6 = mp.parseExpiry("Apr 17") # falls back to dateutil
+
+	def testDates(self):
+		self.setUp()
+		self.assertEqual(self.d1, datetime(self.year, 4, 17, tzinfo=timezone.utc))
+		self.assertEqual(self.d1, self.d2)
+		self.assertEqual(self.d1, self.d6)
+		self.assertEqual(self.d3, datetime(2022, 1, 18, tzinfo=timezone.utc))
+		self.assertEqual(self.d3, self.d4)
+		self.assertEqual(self.d3, self.d5)
+
+	def testInvalid(self):
+		self.assertRaises(ValueError, mp.parseExpiry, "2/30")
+
 class TestParseDurationInfo(unittest.TestCase):
 	def setUp(self):
 		self.n1 = mp.parseDurationInfo("7d")
@@ -101,6 +124,33 @@ class TestParseDurationInfo(unittest.TestCase):
 		self.assertEqual(self.n1, self.n3)
 		self.assertEqual(self.n1, self.n4)
 
+class TestContract(unittest.TestCase):
+	def setUp(self):
+		self.c1 = mp.Contract.fromSymbol("SPY200417C00300000")
+		self.c2 = mp.Contract.fromSymbol("SPY200417C00300000")
+		self.c3 = mp.Contract.fromSymbol("T220118P02010500")
+
+	def testInterned(self):
+		self.setUp()
+		self.assertIs(self.c1, self.c2)
+
+	def testFields(self):
+		self.setUp()
+		self.assertEqual(self.c3.ticker, "T")
+		self.assertEqual(self.c3.expiry, datetime(2022, 1, 18, tzinfo=timezone.utc))
+		self.assertEqual(self.c3.optionType, "P")
+		self.assertEqual(self.c3.strike, 2010500)
+		self.assertEqual(self.c3.strikeAsString(), "2010.500")
+
+	def testRoundTrip(self):
+		self.setUp()
+		self.assertEqual(str(self.c1), "SPY200417C00300000")
+		self.assertEqual(str(self.c3), "T220118P02010500")
+		self.assertEqual(mp.Contract(self.c3.ticker, self.c3.expiry, "P", 2010500), self.c3)
+
+	def testInvalid(self):
+		self.assertRaises(ValueError, mp.Contract.fromSymbol, "SPY")
+
 
 ## stringFormat tests
 class TestFormatStrikeAsString(unittest.TestCase):
@@ -0,0 +1,140 @@
+# SQLite-backed storage for historical chart bars
+import sqlite3
+import threading
+
+
+'''
+##############
+## OVERVIEW ##
+##############
+
+BarStore(String fileName)
+	Opens (or creates) the bar database
+
+BarStore.coverage(String symbol, String interval)
+	Returns the (start, end, previousClose) of the stored range, or None if nothing is stored
+
+BarStore.missing(String symbol, String interval, int start, int end, float freshFor)
+	Returns the (period1, period2) ranges that have to be fetched to cover start - end
+
+BarStore.add(String symbol, String interval, int period1, int period2, dict data)
+	Stores the bars from a v8 chart response covering period1 - period2
+
+BarStore.read(String symbol, String interval, int start, int end)
+	Returns the stored bars from start to end as a v8-shaped chart response
+
+'''
+
+
+class BarStore:
+	# (String fileName)
+	# Opens (or creates) the bar database
+	def __init__(self, fileName):
+		self.lock = threading.Lock() # Bars are read/written from worker threads
+		try:
+			self.conn = sqlite3.connect(fileName, check_same_thread=False)
+			self.conn.execute("PRAGMA journal_mode=WAL")
+			# A close/volume can be NULL - Yahoo leaves blanks, which the chart fills in
+			self.conn.execute("CREATE TABLE IF NOT EXISTS bars (symbol TEXT, interval TEXT, ts INTEGER, close REAL, "
+				"volume REAL, PRIMARY KEY (symbol, interval, ts)) WITHOUT ROWID")
+			# The (contiguous) range that's been fetched for each symbol/interval
+			self.conn.execute("CREATE TABLE IF NOT EXISTS coverage (symbol TEXT, interval TEXT, start INTEGER, "
+				"end INTEGER, previousClose REAL, PRIMARY KEY (symbol, interval))")
+		except sqlite3.Error:
+			raise ValueError("Could not open the bar database")
+
+
+
+	# coverage(String symbol, String interval)
+	# Returns the (start, end, previousClose) of the stored range, or None if nothing is stored
+	# previousClose is the close before start
+	def coverage(self, symbol, interval):
+		with self.lock:
+			return self.conn.execute("SELECT start, end, previousClose FROM coverage WHERE symbol = ? AND interval = ?",
+				(symbol, interval)).fetchone()
+
+
+
+	# missing(String symbol, String interval, int start, int end, float freshFor)
+	# Returns the (period1, period2) ranges that have to be fetched to cover start - end
+	# The tail is refetched from the last stored bar (which may have still been forming), unless it was fetched in the
+	# last freshFor seconds. Anything before the stored range is backfilled in one request
+	def missing(self, symbol, interval, start, end, freshFor=0):
+		covered = self.coverage(symbol, interval)
+		if covered is None:
+			return [(start, end)]
+
+		coveredStart, coveredEnd, previousClose = covered
+		# Anything past the end of the stored range has to be fetched anyway, so a gap can't form
+		if start > coveredEnd:
+			return [(start, end)]
+
+		ranges = []
+		if start < coveredStart:
+			ranges.append((start, coveredStart))
+		if end > coveredEnd + freshFor:
+			ranges.append((self.lastBar(symbol, interval, coveredStart, coveredEnd), end))
+		return ranges
+
+
+
+	# lastBar(String symbol, String interval, int start, int default)
+	# Returns the timestamp of the last stored bar from start onwards (or the default, if there aren't any)
+	def lastBar(self, symbol, interval, start, default):
+		with self.lock:
+			last, = self.conn.execute("SELECT MAX(ts) FROM bars WHERE symbol = ? AND interval = ? AND ts >= ?",
+				(symbol, interval, start)).fetchone()
+		return default if last is None else last
+
+
+
+	# add(String symbol, String interval, int period1, int period2, dict data)
+	# Stores the bars from a v8 chart response covering period1 - period2 (existing bars are overwritten)
+	def add(self, symbol, interval, period1, period2, data):
+		try:
+			result = data['chart']['result'][0]
+		except:
+			raise ValueError("Not a chart response")
+
+		timestamps = result.get('timestamp') or [] # Missing entirely when the market was closed
+		quote = result['indicators']['quote'][0] if timestamps else {}
+		rows = [(symbol, interval, ts, close, volume)
+			for ts, close, volume in zip(timestamps, quote.get('close', []), quote.get('volume', []))]
+		previousClose = result['meta'].get('chartPreviousClose', result['meta'].get('previousClose'))
+
+		with self.lock, self.conn:
+			self.conn.executemany("INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?)", rows)
+
+			covered = self.conn.execute("SELECT start, end, previousClose FROM coverage WHERE symbol = ? AND "
+				"interval = ?", (symbol, interval)).fetchone()
+			# A range past the end of the stored one starts over (the old bars are refetched if they're needed again)
+			if covered is not None and period1 <= covered[1]:
+				# The close before the range only changes when the range is extended backwards
+				if period1 >= covered[0]:
+					period1, previousClose = covered[0], covered[2]
+				period2 = max(period2, covered[1])
+			self.conn.execute("INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?, ?)",
+				(symbol, interval, period1, period2, previousClose))
+
+
+
+	# read(String symbol, String interval, int start, int end)
+	# Returns the stored bars from start to end as a v8-shaped chart response (so it can be drawn like one)
+	def read(self, symbol, interval, start, end):
+		covered = self.coverage(symbol, interval)
+		coveredStart, coveredEnd, previousClose = (start, end, None) if covered is None else covered
+
+		with self.lock:
+			rows = self.conn.execute("SELECT ts, close, volume FROM bars WHERE symbol = ? AND interval = ? AND "
+				"ts >= ? AND ts <= ? ORDER BY ts", (symbol, interval, start, end)).fetchall()
+			# The close before the window, falling back on the one before everything stored
+			before = self.conn.execute("SELECT close FROM bars WHERE symbol = ? AND interval = ? AND ts >= ? AND "
+				"ts < ? AND close IS NOT NULL ORDER BY ts DESC LIMIT 1", (symbol, interval, coveredStart, start)).fetchone()
+
+		if before is not None:
+			previousClose = before[0]
+		result = {"meta": {"symbol": symbol, "chartPreviousClose": previousClose},
+			"indicators": {"quote": [{"close": [row[1] for row in rows], "volume": [row[2] for row in rows]}]}}
+		if rows:
+			result["timestamp"] = [row[0] for row in rows]
+		return {"chart": {"result": [result], "error": None}}
@@ -0,0 +1,35 @@
+import greeks
+import numpy as np
+import timeit
+
+'''
+Times the greeks and the IV solver on a synthetic book of contracts
+
+Run from this folder (like the tests): python benchmarkGreeks.py
+'''
+
+CONTRACTS = 10000
+NUMBER = 20
+
+random = np.random.default_rng(0)
+spot = np.full(CONTRACTS, 100.0)
+strike = random.uniform(50, 150, CONTRACTS)
+t = random.uniform(1 / 365, 2, CONTRACTS)
+vol = random.uniform(0.1, 1.0, CONTRACTS)
+isCall = random.random(CONTRACTS) < 0.5
+value = greeks.price(spot, strike, t, greeks.RISK_FREE_RATE, vol, isCall)
+
+
+
+def withGreeks():
+	greeks.greeks(spot, strike, t, greeks.RISK_FREE_RATE, vol, isCall)
+
+def withImpliedVolatility():
+	greeks.impliedVolatility(value, spot, strike, t, greeks.RISK_FREE_RATE, isCall)
+
+
+
+if __name__ == "__main__":
+	for name, function in [("greeks", withGreeks), ("impliedVolatility", withImpliedVolatility)]:
+		seconds = min(timeit.repeat(function, number=NUMBER, repeat=5))
+		print("{0:<18} {1:8.2f} ms/{2} contracts".format(name, seconds / NUMBER * 1e3, CONTRACTS))
@@ -0,0 +1,154 @@
+# Vectorized Black-Scholes pricing, greeks, and implied volatility
+import numpy as np
+import os
+import time
+
+
+'''
+##############
+## OVERVIEW ##
+##############
+
+Every function takes NumPy arrays (or scalars) and broadcasts them, so a whole chain/portfolio is priced in one call
+
+normCDF(array x)
+	The standard normal CDF
+
+yearsToExpiry(array expiration, float now)
+	Converts expiration timestamps (as Yahoo gives them) into years until expiry
+
+price(array spot, array strike, array t, float rate, array vol, array isCall)
+	The Black-Scholes value of each option
+
+greeks(array spot, array strike, array t, float rate, array vol, array isCall)
+	The value, delta, gamma, theta (per day) and vega (per vol point) of each option
+
+impliedVolatility(array value, array spot, array strike, array t, float rate, array isCall, array seed)
+	Solves for the volatility that prices each option at the given value
+
+'''
+
+
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", 0.05))
+
+YEAR = 365 * 24 * 60 * 60
+# Yahoo's expirations are midnight UTC - the options stop trading at 4PM Eastern (~20:00 UTC)
+CLOSE_OFFSET = 20 * 60 * 60
+# Keeps t (and so the greeks) finite on expiration day
+MIN_T = 60 / YEAR
+
+# The IV solver's bounds and defaults
+MIN_VOL, MAX_VOL = 1e-4, 5.0
+DEFAULT_VOL = 0.3
+
+
+
+# normCDF(array x)
+# The standard normal CDF (Abramowitz & Stegun 7.1.26, accurate to ~1e-7)
+def normCDF(x):
+	x = np.asarray(x, dtype=float)
+	z = np.abs(x) / np.sqrt(2)
+	k = 1 / (1 + 0.3275911 * z)
+	poly = k * (0.254829592 + k * (-0.284496736 + k * (1.421413741 + k * (-1.453152027 + k * 1.061405429))))
+	erf = 1 - poly * np.exp(-z * z)
+	return 0.5 * (1 + np.sign(x) * erf)
+
+
+
+# normPDF(array x)
+# The standard normal PDF
+def normPDF(x):
+	return np.exp(-0.5 * np.square(x)) / np.sqrt(2 * np.pi)
+
+
+
+# yearsToExpiry(array expiration, float now)
+# Converts expiration timestamps (as Yahoo gives them) into years until expiry
+def yearsToExpiry(expiration, now=None):
+	now = time.time() if now is None else now
+	return np.maximum((np.asarray(expiration, dtype=float) + CLOSE_OFFSET - now) / YEAR, MIN_T)
+
+
+
+# d1d2(array spot, array strike, array t, float rate, array vol)
+# The d1 and d2 terms of the Black-Scholes formula
+def d1d2(spot, strike, t, rate, vol):
+	volT = vol * np.sqrt(t)
+	d1 = (np.log(spot / strike) + (rate + 0.5 * np.square(vol)) * t) / volT
+	return d1, d1 - volT
+
+
+
+# price(array spot, array strike, array t, float rate, array vol, array isCall)
+# The Black-Scholes value of each option
+def price(spot, strike, t, rate, vol, isCall):
+	spot, strike, t, vol = [np.asarray(x, dtype=float) for x in (spot, strike, t, vol)]
+	d1, d2 = d1d2(spot, strike, t, rate, vol)
+	discount = strike * np.exp(-rate * t)
+	call = spot * normCDF(d1) - discount * normCDF(d2)
+	# Put-call parity
+	return np.where(isCall, call, call - spot + discount)
+
+
+
+# greeks(array spot, array strike, array t, float rate, array vol, array isCall)
+# The value, delta, gamma, theta (per day) and vega (per vol point) of each option
+# Returns a dict of arrays
+def greeks(spot, strike, t, rate, vol, isCall):
+	spot, strike, t, vol = [np.asarray(x, dtype=float) for x in (spot, strike, t, vol)]
+	d1, d2 = d1d2(spot, strike, t, rate, vol)
+	discount = strike * np.exp(-rate * t)
+	pdf = normPDF(d1)
+	sqrtT = np.sqrt(t)
+
+	callDelta = normCDF(d1)
+	callValue = spot * callDelta - discount * normCDF(d2)
+	decay = -spot * pdf * vol / (2 * sqrtT)
+	callTheta = decay - rate * discount * normCDF(d2)
+	putTheta = decay + rate * discount * normCDF(-d2)
+
+	return {
+		"value": np.where(isCall, callValue, callValue - spot + discount),
+		"delta": np.where(isCall, callDelta, callDelta - 1),
+		"gamma": pdf / (spot * vol * sqrtT),
+		"theta": np.where(isCall, callTheta, putTheta) / 365,
+		"vega": spot * pdf * sqrtT / 100,
+	}
+
+
+
+# impliedVolatility(array value, array spot, array strike, array t, float rate, array isCall, array seed)
+# Solves for the volatility that prices each option at the given value
+# Newton's method (seeded from Yahoo's IV, where we have it), falling back to bisection whenever a step leaves
+# the bracket. Options priced outside of their no-arbitrage bounds come back as NaN
+def impliedVolatility(value, spot, strike, t, rate, isCall, seed=None, tol=1e-6, maxIter=50):
+	value, spot, strike, t = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (value, spot, strike, t)])
+	isCall = np.broadcast_to(isCall, value.shape)
+
+	vol = np.full(value.shape, DEFAULT_VOL)
+	if seed is not None:
+		seed = np.broadcast_to(np.asarray(seed, dtype=float), value.shape)
+		usable = np.isfinite(seed) & (seed > MIN_VOL) & (seed < MAX_VOL)
+		vol = np.where(usable, seed, vol)
+
+	low, high = np.full(value.shape, MIN_VOL), np.full(value.shape, MAX_VOL)
+	for i in range(maxIter):
+		result = greeks(spot, strike, t, rate, vol, isCall)
+		error = result["value"] - value
+		if np.all(np.abs(error) < tol):
+			break
+
+		# Price is increasing in vol, so the error tells us which side of the root we're on
+		high = np.where(error > 0, vol, high)
+		low = np.where(error < 0, vol, low)
+
+		vega = result["vega"] * 100
+		with np.errstate(divide="ignore", invalid="ignore"):
+			step = vol - error / vega
+		inBracket = np.isfinite(step) & (step > low) & (step < high)
+		vol = np.where(inBracket, step, (low + high) / 2)
+
+	# No volatility reaches these prices
+	lowest = price(spot, strike, t, rate, MIN_VOL, isCall)
+	highest = price(spot, strike, t, rate, MAX_VOL, isCall)
+	return np.where((value < lowest - tol) | (value > highest + tol), np.nan, vol)
@@ -0,0 +1,143 @@
+# Shared async HTTP client for talking to Yahoo
+import aiohttp
+import asyncio
+import json
+import os
+
+
+'''
+##############
+## OVERVIEW ##
+##############
+
+configure(int poolSize, int concurrency, float timeout)
+	Overrides the pool size, concurrency limit and per-request timeout
+
+getSession()
+	Returns the shared keep-alive session (creating it if needed)
+
+fetchText(String url)
+	Fetches the body of the given URL (concurrent calls for the same URL share one request)
+
+fetchJSON(String url)
+	Fetches the given URL and decodes the JSON body
+
+close()
+	Closes the shared session (call this on shutdown)
+
+'''
+
+
+# Defaults can be overriden from the .env file
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
+CONCURRENCY = int(os.getenv("HTTP_CONCURRENCY", 10))
+TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10))
+KEEPALIVE = 30
+
+# Yahoo rejects requests without a user agent
+HEADERS = {"User-Agent": "Mozilla/5.0 (OptionsBot)"}
+
+_session = None
+_semaphore = None
+_loop = None
+_inflight = {} # url -> the task currently fetching it
+
+
+
+# configure(int poolSize, int concurrency, float timeout)
+# Overrides the pool size, concurrency limit and per-request timeout
+# Only takes effect for sessions created after the call
+def configure(poolSize=None, concurrency=None, timeout=None):
+	global POOL_SIZE, CONCURRENCY, TIMEOUT
+	if poolSize is not None:
+		POOL_SIZE = poolSize
+	if concurrency is not None:
+		CONCURRENCY = concurrency
+	if timeout is not None:
+		TIMEOUT = timeout
+
+
+
+
+
+# getSession()
+# Returns the shared keep-alive session (creating it if needed)
+def getSession():
+	global _session, _semaphore, _loop
+	loop = asyncio.get_running_loop()
+
+	# Sessions are tied to the loop they were made in, so a new loop (eg. asyncio.run in the tests) needs a new one
+	if _session is None or _session.closed or _loop is not loop:
+		connector = aiohttp.TCPConnector(limit=POOL_SIZE, keepalive_timeout=KEEPALIVE)
+		_session = aiohttp.ClientSession(connector=connector, headers=HEADERS,
+			timeout=aiohttp.ClientTimeout(total=TIMEOUT))
+		_semaphore = asyncio.Semaphore(CONCURRENCY)
+		_loop = loop
+		_inflight.clear()
+
+	return _session
+
+
+
+
+
+# fetchText(String url)
+# Fetches the body of the given URL
+# If the URL is already being fetched, this waits on that request instead of making another one
+async def fetchText(url):
+	getSession()
+	task = _inflight.get(url)
+	if task is None:
+		task = asyncio.ensure_future(_fetch(url))
+		_inflight[url] = task
+		task.add_done_callback(lambda done: _forget(url, done))
+
+	# Shielded, so one caller giving up doesn't cancel the request for everyone else
+	return await asyncio.shield(task)
+
+
+
+
+
+# _forget(String url, Task task)
+# Stops sharing the given task once it's done
+def _forget(url, task):
+	if _inflight.get(url) is task:
+		del _inflight[url]
+
+
+
+
+
+# _fetch(String url)
+# Makes the actual request
+async def _fetch(url):
+	session = getSession()
+	try:
+		async with _semaphore:
+			async with session.get(url) as response:
+				response.raise_for_status()
+				return await response.text()
+	except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+		raise ValueError("Could not load data from URL ({0})".format(e))
+
+
+
+
+
+# fetchJSON(String url)
+# Fetches the given URL and decodes the JSON body
+async def fetchJSON(url):
+	return json.loads(await fetchText(url))
+
+
+
+
+
+# close()
+# Closes the shared session (call this on shutdown)
+async def close():
+	global _session
+	if _session is not None and not _session.closed:
+		await _session.close()
+	_session = None
@@ -0,0 +1,151 @@
+# SQLite-backed storage for the economy
+import sqlite3
+import threading
+import asyncio
+import json
+import logging
+import os
+
+
+'''
+##############
+## OVERVIEW ##
+##############
+
+Ledger(String fileName, String importFrom, int flushThreshold)
+	Loads the ledger from the SQLite database (importing the old JSON file if the database is new)
+
+Ledger.save(String ID)
+	Saves the given user (or everything, if no ID is given) in a single transaction
+
+Ledger.markDirty(String ID)
+	Marks the given user as changed, so they're saved by the next flush
+
+Ledger.flush()
+	Saves every changed user in a single transaction
+
+Ledger.flushLoop(float interval)
+	Flushes every interval seconds (or sooner, once enough users have changed) until cancelled (coroutine)
+
+Ledger.importJSON(String fileName)
+	Imports every entry from a (jFile-style) JSON file
+
+'''
+
+
+# How often (in seconds) changes are written, and how many changed users trigger an early write
+FLUSH_INTERVAL = 5
+FLUSH_THRESHOLD = 50
+
+logger = logging.getLogger(__name__)
+
+
+
+class Ledger:
+	# (String fileName, String importFrom, int flushThreshold)
+	# Loads the ledger from the SQLite database (importing the old JSON file if the database is new)
+	def __init__(self, fileName, importFrom=None, flushThreshold=FLUSH_THRESHOLD):
+		self.fileName = fileName
+		self.flushThreshold = flushThreshold
+		self.dirty = set()
+		self.flushNow = asyncio.Event()
+		self.lock = threading.Lock() # Flushes are written from a worker thread
+		try:
+			self.conn = sqlite3.connect(fileName, check_same_thread=False)
+			# WAL keeps a crash mid-write from corrupting the database
+			self.conn.execute("PRAGMA journal_mode=WAL")
+			self.conn.execute("CREATE TABLE IF NOT EXISTS ledger (id TEXT PRIMARY KEY, value TEXT NOT NULL)")
+			rows = self.conn.execute("SELECT id, value FROM ledger").fetchall()
+		except sqlite3.Error:
+			raise ValueError("Could not load data from the database")
+
+		# Everything is kept in memory - the database only gets writes
+		self.data = {ID: json.loads(value) for ID, value in rows}
+
+		if not self.data and importFrom is not None and os.path.isfile(importFrom):
+			self.importJSON(importFrom)
+
+
+
+	# save(String ID)
+	# Saves the given user (or everything, if no ID is given) in a single transaction
+	def save(self, ID=None):
+		IDs = list(self.data.keys()) if ID is None else [str(ID)]
+		self.dirty.difference_update(IDs)
+		self.write(self.serialize(IDs))
+
+
+
+	# markDirty(String ID)
+	# Marks the given user as changed, so they're saved by the next flush
+	def markDirty(self, ID):
+		self.dirty.add(str(ID))
+		if len(self.dirty) >= self.flushThreshold:
+			self.flushNow.set()
+
+
+
+	# flush()
+	# Saves every changed user in a single transaction
+	def flush(self):
+		self.write(self.takeDirty())
+
+
+
+	# flushLoop(float interval)
+	# Flushes every interval seconds (or sooner, once enough users have changed) until cancelled
+	async def flushLoop(self, interval=FLUSH_INTERVAL):
+		loop = asyncio.get_running_loop()
+		while True:
+			try:
+				await asyncio.wait_for(self.flushNow.wait(), timeout=interval)
+			except asyncio.TimeoutError:
+				pass
+			self.flushNow.clear()
+
+			# The users are serialized here (so they can't change mid-write), but written off the event loop
+			rows = self.takeDirty()
+			if rows:
+				try:
+					await loop.run_in_executor(None, self.write, rows)
+				except Exception:
+					# Nothing was written (the transaction rolled back), so they're retried on the next flush
+					logger.exception("Could not write %d users to the ledger, retrying later", len(rows))
+					self.dirty.update(ID for ID, value in rows)
+
+
+
+	# takeDirty()
+	# Serializes the changed users and clears the dirty set
+	def takeDirty(self):
+		IDs, self.dirty = self.dirty, set()
+		return self.serialize(IDs)
+
+
+
+	# serialize(list[String] IDs)
+	# Turns the given users into database rows
+	def serialize(self, IDs):
+		return [(ID, json.dumps(self.data[ID])) for ID in IDs if ID in self.data]
+
+
+
+	# write(list[(String, String)] rows)
+	# Writes the rows in a single transaction
+	def write(self, rows):
+		with self.lock, self.conn: # Commits if everything was written, rolls back otherwise
+			self.conn.executemany("INSERT OR REPLACE INTO ledger (id, value) VALUES (?, ?)", rows)
+
+
+
+	# importJSON(String fileName)
+	# Imports every entry from a (jFile-style) JSON file
+	def importJSON(self, fileName):
+		try:
+			with open(fileName) as f:
+				data = json.load(f)
+		except:
+			raise ValueError("Could not load data from json file")
+
+		self.data.update(data)
+		self.save()
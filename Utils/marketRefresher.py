@@ -0,0 +1,119 @@
+# Keeps the quotes for hot symbols warm in the cache
+from datetime import datetime, time
+from zoneinfo import ZoneInfo
+import asyncio
+from Utils import optionsUtil as ou
+
+
+'''
+##############
+## OVERVIEW ##
+##############
+
+MarketRefresher(function heldSymbols, float recentWindow)
+	Refreshes the quotes for held and recently requested symbols in the background
+
+MarketRefresher.hotSymbols()
+	Returns the symbols whose quotes should be kept warm
+
+MarketRefresher.hotOptions()
+	Returns the contracts whose option info (for !op and !c) should be kept warm
+
+MarketRefresher.cadence(datetime now)
+	Returns how long to wait between refreshes, based on the time of day
+
+MarketRefresher.refresh()
+	Fetches all the hot symbols (in batched requests) and options (coroutine)
+
+MarketRefresher.run()
+	Refreshes on the cadence until cancelled (coroutine)
+
+'''
+
+
+MARKET_TZ = ZoneInfo("America/New_York")
+
+# (start, end, seconds between refreshes) - anything outside of these is closed
+SESSIONS = [
+	(time(9, 30), time(16, 0), 30), # Regular hours
+	(time(4, 0), time(9, 30), 2 * 60), # Pre-market
+	(time(16, 0), time(20, 0), 2 * 60), # After-hours
+]
+CLOSED_CADENCE = 15 * 60
+
+# Symbols someone asked for within this many seconds are kept warm
+RECENT_WINDOW = 15 * 60
+
+
+
+class MarketRefresher:
+	# (function heldSymbols, float recentWindow)
+	# heldSymbols returns every symbol currently held (eg. in the ledger)
+	def __init__(self, heldSymbols, recentWindow=RECENT_WINDOW):
+		self.heldSymbols = heldSymbols
+		self.recentWindow = recentWindow
+
+
+
+	# hotSymbols()
+	# Returns the symbols whose quotes should be kept warm (anything held, or requested in the last recentWindow seconds)
+	def hotSymbols(self):
+		return set(self.heldSymbols()) | self.recent(ou.requested)
+
+
+
+	# hotOptions()
+	# Returns the contracts whose option info should be kept warm (anything requested in the last recentWindow seconds)
+	def hotOptions(self):
+		return self.recent(ou.requestedOptions)
+
+
+
+	# recent(dict requested)
+	# Drops everything from requested (symbol -> when it was requested) that's older than recentWindow seconds
+	# Returns the symbols that are left
+	def recent(self, requested):
+		cutoff = datetime.now().timestamp() - self.recentWindow
+		for symbol, when in list(requested.items()):
+			if when < cutoff:
+				del requested[symbol]
+		return set(requested)
+
+
+
+	# cadence(datetime now)
+	# Returns how long to wait between refreshes, based on the time of day (market holidays aren't accounted for)
+	def cadence(self, now=None):
+		now = datetime.now(MARKET_TZ) if now is None else now.astimezone(MARKET_TZ)
+		if now.weekday() < 5:
+			for start, end, seconds in SESSIONS:
+				if start <= now.time() < end:
+					return seconds
+		return CLOSED_CADENCE
+
+
+
+	# refresh()
+	# Fetches all the hot symbols in batched requests, and the hot options (the options endpoint takes one at a time)
+	# Everything stays fresh until the next refresh is due, so commands read it straight from the cache
+	async def refresh(self):
+		ttl = self.cadence() + 5
+		symbols = self.hotSymbols()
+		if symbols:
+			await ou.getQuotes(symbols, refresh=True, ttl=ttl)
+
+		# One bad contract shouldn't stop the rest from being refreshed
+		await asyncio.gather(*[ou.getOptionInfo(symbol, refresh=True, ttl=ttl) for symbol in self.hotOptions()],
+			return_exceptions=True)
+
+
+
+	# run()
+	# Refreshes on the cadence until cancelled
+	async def run(self):
+		while True:
+			try:
+				await self.refresh()
+			except (ValueError, KeyError):
+				pass # Yahoo hiccuped - the commands fall back to fetching live until the next refresh
+			await asyncio.sleep(self.cadence())
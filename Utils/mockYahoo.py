@@ -0,0 +1,308 @@
+# A local stand-in for the parts of Yahoo's API the bot uses (for offline tests and load testing)
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from aiohttp import web
+import numpy as np
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+
+parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent)
+from Formatting.contract import Contract
+from Utils import greeks
+
+
+'''
+##############
+## OVERVIEW ##
+##############
+
+Point the bot at it with YAHOO_URL=http://<host>:<port> (see optionsUtil.YAHOO_URL)
+
+MockYahoo(float latency, float jitter, float errorRate, float rateLimitRate, int seed, String recorded)
+	Serves the v7 options, v7 quote and v8 chart endpoints, with synthetic data (or recorded responses)
+
+MockYahoo.app()
+	Returns the aiohttp application
+
+MockYahoo.start(String host, int port)
+	Starts serving in the background, returning the runner (coroutine)
+
+MockYahoo.quote(String symbol)
+	Returns the quote for a stock or contract symbol
+
+MockYahoo.optionChain(String symbol, int date)
+	Returns the options endpoint's result for a ticker (at an expiration) or a contract symbol
+
+MockYahoo.chart(String symbol, int period1, int period2, String interval)
+	Returns the chart endpoint's response for the symbol between the two timestamps
+
+'''
+
+
+MARKET_TZ = ZoneInfo("America/New_York")
+# How many expirations (weekly, on Fridays) and strikes on either side of the spot each ticker has
+EXPIRATIONS = 8
+STRIKES = 20
+# The volatility every synthetic option is priced at
+VOLATILITY = 0.3
+
+
+
+class MockYahoo:
+	# (float latency, float jitter, float errorRate, float rateLimitRate, int seed, String recorded)
+	# Every response waits latency (+/- jitter) seconds. errorRate of the requests get a 500, and rateLimitRate a 429
+	# The same seed always gives the same prices and the same sequence of failures
+	# Responses saved in the recorded folder (eg. chart_SPY_5m.json, options_SPY.json, quote_SPY.json) are served
+	# instead of the synthetic ones
+	def __init__(self, latency=0, jitter=0, errorRate=0, rateLimitRate=0, seed=0, recorded=None):
+		self.latency = latency
+		self.jitter = jitter
+		self.errorRate = errorRate
+		self.rateLimitRate = rateLimitRate
+		self.seed = seed
+		self.recorded = recorded
+		self.random = random.Random(seed)
+		self.requests = 0
+
+
+
+	# app()
+	# Returns the aiohttp application
+	def app(self):
+		app = web.Application(middlewares=[self.conditions])
+		app.router.add_get("/v7/finance/options/{symbol}", self.handleOptions)
+		app.router.add_get("/v7/finance/quote", self.handleQuote)
+		app.router.add_get("/v8/finance/chart/{symbol}", self.handleChart)
+		return app
+
+
+
+	# start(String host, int port)
+	# Starts serving in the background, returning the runner (await runner.cleanup() to stop)
+	# With port 0, a free port is picked - read it from runner.addresses
+	async def start(self, host="127.0.0.1", port=0):
+		runner = web.AppRunner(self.app())
+		await runner.setup()
+		await web.TCPSite(runner, host, port).start()
+		return runner
+
+
+
+	# conditions(Request request, function handler)
+	# Applies the latency and the failures before handing the request over
+	@web.middleware
+	async def conditions(self, request, handler):
+		self.requests += 1
+		delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+		if delay > 0:
+			await asyncio.sleep(delay)
+
+		roll = self.random.random()
+		if roll < self.rateLimitRate:
+			return web.Response(status=429, text="Too Many Requests", headers={"Retry-After": "1"})
+		if roll < self.rateLimitRate + self.errorRate:
+			return web.Response(status=500, text="Internal Server Error")
+		return await handler(request)
+
+
+
+	async def handleOptions(self, request):
+		symbol = request.match_info["symbol"].upper()
+		date = request.query.get("date")
+		name = "options_{0}".format(symbol if date is None else "{0}_{1}".format(symbol, date))
+		result = self.load(name) or self.optionChain(symbol, None if date is None else int(date))
+		return web.json_response({"optionChain": {"result": [result], "error": None}})
+
+	async def handleQuote(self, request):
+		symbols = [symbol.upper() for symbol in request.query.get("symbols", "").split(",") if symbol]
+		result = [self.load("quote_" + symbol) or self.quote(symbol) for symbol in symbols]
+		return web.json_response({"quoteResponse": {"result": result, "error": None}})
+
+	async def handleChart(self, request):
+		symbol = request.match_info["symbol"].upper()
+		interval = request.query.get("interval", "1d")
+		data = self.load("chart_{0}_{1}".format(symbol, interval))
+		if data is None:
+			try:
+				period1, period2 = int(request.query["period1"]), int(request.query["period2"])
+			except (KeyError, ValueError):
+				raise web.HTTPBadRequest(text="period1 and period2 are required")
+			data = self.chart(symbol, period1, period2, interval)
+		return web.json_response(data)
+
+
+
+	# load(String name)
+	# Returns the recorded response with the given name (or None, if there isn't one)
+	def load(self, name):
+		if self.recorded is None:
+			return None
+		fileName = os.path.join(self.recorded, name + ".json")
+		if not os.path.isfile(fileName):
+			return None
+		with open(fileName) as f:
+			return json.load(f)
+
+
+
+	# spot(String ticker)
+	# Returns the (made up, but always the same) price of the ticker
+	def spot(self, ticker):
+		return round(random.Random("{0}:{1}".format(self.seed, ticker)).uniform(20, 500), 2)
+
+
+
+	# previousClose(String ticker)
+	# Returns the ticker's previous close (within 2% of its spot, so the daily changes look real)
+	def previousClose(self, ticker):
+		drift = random.Random("{0}:{1}:previous".format(self.seed, ticker)).uniform(-0.02, 0.02)
+		return round(self.spot(ticker) * (1 + drift), 2)
+
+
+
+	# quote(String symbol)
+	# Returns the quote for a stock or contract symbol (contracts are priced off their underlying's spot)
+	def quote(self, symbol):
+		try:
+			contract = Contract.fromSymbol(symbol)
+		except ValueError:
+			contract = None
+
+		if contract is None:
+			price, previousClose, quoteType = self.spot(symbol), self.previousClose(symbol), "EQUITY"
+		else:
+			price = round(float(self.contractPrice(contract, self.spot(contract.ticker))), 2)
+			previousClose = round(float(self.contractPrice(contract, self.previousClose(contract.ticker))), 2)
+			quoteType = "OPTION"
+
+		change = round(price - previousClose, 2)
+		changePercent = change / previousClose * 100 if previousClose else 0.0
+		return {"symbol": symbol, "quoteType": quoteType, "shortName": symbol, "currency": "USD",
+			"regularMarketPrice": price, "regularMarketChange": change, "regularMarketChangePercent": changePercent,
+			"regularMarketPreviousClose": previousClose, "postMarketPrice": price, "postMarketChange": change,
+			"postMarketChangePercent": changePercent}
+
+
+
+	# contractPrice(Contract contract, float spot)
+	# Prices the contract with Black-Scholes (at VOLATILITY)
+	def contractPrice(self, contract, spot):
+		t = greeks.yearsToExpiry(contract.expiry.timestamp())
+		return greeks.price(spot, contract.strike / 1000, t, greeks.RISK_FREE_RATE, VOLATILITY, contract.optionType == "C")
+
+
+
+	# expirations()
+	# Returns the next EXPIRATIONS Fridays (as midnight UTC timestamps, like Yahoo's)
+	def expirations(self):
+		today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+		friday = today + timedelta(days=(4 - today.weekday()) % 7)
+		return [int((friday + timedelta(weeks=i)).timestamp()) for i in range(EXPIRATIONS)]
+
+
+
+	# strikes(float spot)
+	# Returns the STRIKES strikes on either side of the spot
+	def strikes(self, spot):
+		step = 1 if spot < 50 else (2.5 if spot < 100 else 5)
+		middle = round(spot / step) * step
+		return [middle + i * step for i in range(-STRIKES, STRIKES + 1) if middle + i * step > 0]
+
+
+
+	# contract(Contract contract, float spot)
+	# Returns the options endpoint's entry for the contract
+	def contract(self, contract, spot):
+		price = round(float(self.contractPrice(contract, spot)), 2)
+		change = round(price - float(self.contractPrice(contract, self.previousClose(contract.ticker))), 2)
+		rng = random.Random("{0}:{1}".format(self.seed, contract.symbol))
+		strike = contract.strike / 1000
+		return {"contractSymbol": contract.symbol, "underlyingSymbol": contract.symbol, "strike": strike,
+			"currency": "USD", "lastPrice": price, "change": change,
+			"percentChange": change / (price - change) * 100 if price != change else 0.0,
+			"volume": rng.randint(0, 5000), "openInterest": rng.randint(0, 20000),
+			"bid": max(0.0, round(price - 0.05, 2)), "ask": round(price + 0.05, 2), "contractSize": "REGULAR",
+			"expiration": int(contract.expiry.timestamp()), "impliedVolatility": VOLATILITY,
+			"inTheMoney": strike < spot if contract.optionType == "C" else strike > spot}
+
+
+
+	# optionChain(String symbol, int date)
+	# Returns the options endpoint's result for a ticker (at the given expiration, or the first) or a contract symbol
+	def optionChain(self, symbol, date=None):
+		try:
+			single = Contract.fromSymbol(symbol)
+		except ValueError:
+			single = None
+
+		if single is not None:
+			return self.contract(single, self.spot(single.ticker))
+
+		spot = self.spot(symbol)
+		expirations = self.expirations()
+		date = expirations[0] if date is None else date
+		expiry = datetime.fromtimestamp(date, timezone.utc)
+		strikes = self.strikes(spot)
+
+		sides = {}
+		for optionType, side in [("C", "calls"), ("P", "puts")]:
+			sides[side] = [self.contract(Contract(symbol, expiry, optionType, int(round(strike * 1000))), spot)
+				for strike in strikes]
+
+		return {"underlyingSymbol": symbol, "expirationDates": expirations, "strikes": strikes, "hasMiniOptions": False,
+			"quote": self.quote(symbol), "options": [dict(expirationDate=date, hasMiniOptions=False, **sides)]}
+
+
+
+	# chart(String symbol, int period1, int period2, String interval)
+	# Returns the chart endpoint's response for the symbol between the two timestamps
+	# Every bar only depends on the symbol and its timestamp, so overlapping requests agree with each other
+	def chart(self, symbol, period1, period2, interval):
+		multiplier = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "wk": 7 * 24 * 60 * 60, "mo": 30 * 24 * 60 * 60}
+		seconds = int(interval.rstrip("mhdwko")) * multiplier[interval.lstrip("0123456789")]
+
+		timestamps = np.arange(period1 - period1 % seconds + seconds, period2 + 1, seconds)
+		local = [datetime.fromtimestamp(int(ts), MARKET_TZ) for ts in timestamps]
+		if seconds < 24 * 60 * 60: # Intraday bars cover pre-market through after-hours, on weekdays
+			keep = [d.weekday() < 5 and 4 <= d.hour < 20 for d in local]
+		else:
+			keep = [d.weekday() < 5 for d in local]
+		timestamps = timestamps[np.array(keep, dtype=bool)] if len(timestamps) else timestamps
+
+		# A slow wave plus per-bar noise, both fixed by the timestamp
+		base = self.spot(symbol)
+		noise = np.modf(np.abs(np.sin(timestamps * 12.9898 + self.seed) * 43758.5453))[0]
+		close = base * (1 + 0.05 * np.sin(timestamps / (5 * 24 * 60 * 60)) + 0.004 * (noise - 0.5))
+		volume = (noise * 10000).astype(int)
+
+		meta = {"currency": "USD", "symbol": symbol, "dataGranularity": interval, "previousClose": base,
+			"chartPreviousClose": base}
+		result = {"meta": meta, "indicators": {"quote": [{"close": np.round(close, 4).tolist(),
+			"volume": volume.tolist()}]}}
+		if len(timestamps):
+			result["timestamp"] = timestamps.tolist()
+		return {"chart": {"result": [result], "error": None}}
+
+
+
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Serves a stand-in for Yahoo's API")
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=8080)
+	parser.add_argument("--latency", type=float, default=0, help="seconds added to every response")
+	parser.add_argument("--jitter", type=float, default=0, help="the latency varies by up to this many seconds")
+	parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests that get a 500")
+	parser.add_argument("--rate-limit", type=float, default=0, help="fraction of requests that get a 429")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--recorded", help="folder of recorded responses to serve instead")
+	args = parser.parse_args()
+
+	mock = MockYahoo(args.latency, args.jitter, args.error_rate, args.rate_limit, args.seed, args.recorded)
+	web.run_app(mock.app(), host=args.host, port=args.port)
@@ -0,0 +1,176 @@
+# Columnar (NumPy) storage for option chains
+import numpy as np
+
+
+'''
+##############
+## OVERVIEW ##
+##############
+
+OptionSide(dict columns)
+	The calls (or puts) of a chain, stored as parallel arrays (one per column in COLUMNS)
+
+OptionSide.fromJSON(list[dict] options)
+	Builds the side from Yahoo's list of contracts
+
+OptionSide.filterMoneyness(float spot, float low, float high)
+	Keeps the contracts with low <= strike / spot <= high
+
+OptionSide.minVolume(int volume)
+	Keeps the contracts with at least the given volume
+
+OptionSide.maxSpread(float spread)
+	Keeps the contracts with a bid/ask spread of at most the given spread
+
+OptionChain(OptionSide calls, OptionSide puts, float spot, float price)
+	The calls and puts for a ticker (the sides can be sliced/filtered, like arrays)
+
+OptionChain.fromJSON(dict data)
+	Builds the chain from a result of Yahoo's options endpoint
+
+OptionChain.concat(list[OptionChain] chains)
+	Joins the given chains (eg. for different expirations) into one
+
+OptionChain.aligned()
+	Lines the calls and puts up by strike (strikes missing either side are left out)
+
+OptionChain.window(int width)
+	Returns the "width" strikes above and below the spot price
+
+'''
+
+
+# column -> (Yahoo's key, dtype, value when Yahoo leaves it out)
+COLUMNS = {
+	"strike": ("strike", float, np.nan),
+	"bid": ("bid", float, np.nan),
+	"ask": ("ask", float, np.nan),
+	"last": ("lastPrice", float, np.nan),
+	"change": ("change", float, 0.0),
+	"percentChange": ("percentChange", float, 0.0),
+	"volume": ("volume", np.int64, 0),
+	"openInterest": ("openInterest", np.int64, 0),
+	"iv": ("impliedVolatility", float, np.nan),
+	"expiration": ("expiration", np.int64, 0),
+	"contractSymbol": ("contractSymbol", object, ""),
+}
+
+
+
+class OptionSide:
+	# (dict columns)
+	# The calls (or puts) of a chain, stored as parallel arrays (one per column in COLUMNS)
+	def __init__(self, columns):
+		self.columns = columns
+		for name, column in columns.items():
+			setattr(self, name, column)
+
+
+
+	# fromJSON(list[dict] options)
+	# Builds the side from Yahoo's list of contracts
+	@staticmethod
+	def fromJSON(options):
+		columns = {}
+		for name, (key, dtype, default) in COLUMNS.items():
+			columns[name] = np.array([option.get(key, default) for option in options], dtype=dtype)
+		return OptionSide(columns)
+
+
+
+	# concat(list[OptionSide] sides)
+	# Joins the given sides into one
+	@staticmethod
+	def concat(sides):
+		return OptionSide({name: np.concatenate([side.columns[name] for side in sides]) for name in COLUMNS})
+
+
+
+	def __len__(self):
+		return len(self.strike)
+
+	# Takes a slice, an index array, or a boolean mask
+	def __getitem__(self, index):
+		return OptionSide({name: column[index] for name, column in self.columns.items()})
+
+
+
+	# spread()
+	# Returns the bid/ask spread of every contract
+	def spread(self):
+		return self.ask - self.bid
+
+
+
+	# filterMoneyness(float spot, float low, float high)
+	# Keeps the contracts with low <= strike / spot <= high
+	def filterMoneyness(self, spot, low, high):
+		moneyness = self.strike / spot
+		return self[(moneyness >= low) & (moneyness <= high)]
+
+
+
+	# minVolume(int volume)
+	# Keeps the contracts with at least the given volume
+	def minVolume(self, volume):
+		return self[self.volume >= volume]
+
+
+
+	# maxSpread(float spread)
+	# Keeps the contracts with a bid/ask spread of at most the given spread
+	def maxSpread(self, spread):
+		return self[self.spread() <= spread]
+
+
+
+
+
+class OptionChain:
+	# (OptionSide calls, OptionSide puts, float spot, float price)
+	# The calls and puts for a ticker (the sides can be sliced/filtered, like arrays)
+	# spot is the previous close (what the window is centred on), and price is the current price (defaults to spot)
+	def __init__(self, calls, puts, spot, price=None):
+		self.calls = calls
+		self.puts = puts
+		self.spot = spot
+		self.price = spot if price is None else price
+
+
+
+	# fromJSON(dict data)
+	# Builds the chain from a result of Yahoo's options endpoint
+	@staticmethod
+	def fromJSON(data):
+		options = data['options'][0]
+		return OptionChain(OptionSide.fromJSON(options['calls']), OptionSide.fromJSON(options['puts']),
+			data['quote']['regularMarketPreviousClose'], data['quote'].get('regularMarketPrice'))
+
+
+
+	# concat(list[OptionChain] chains)
+	# Joins the given chains (eg. for different expirations) into one
+	@staticmethod
+	def concat(chains):
+		return OptionChain(OptionSide.concat([chain.calls for chain in chains]),
+			OptionSide.concat([chain.puts for chain in chains]), chains[0].spot, chains[0].price)
+
+
+
+	# aligned()
+	# Lines the calls and puts up by strike (strikes missing either side are left out)
+	# Only meaningful for a single expiration
+	def aligned(self):
+		strikes, callIndex, putIndex = np.intersect1d(self.calls.strike, self.puts.strike, return_indices=True)
+		return OptionChain(self.calls[callIndex], self.puts[putIndex], self.spot, self.price)
+
+
+
+	# window(int width)
+	# Returns the "width" strikes above and below the spot price (the chain should be aligned)
+	# Near either end of the strikes, the window is shifted so it still holds 2 * width + 1 strikes
+	def window(self, width=5):
+		i = int(np.searchsorted(self.calls.strike, self.spot)) # The first strike at or above the spot
+		size = 2 * width + 1
+		start = max(0, min(i - width, len(self.calls) - size))
+		return OptionChain(self.calls[start:start + size], self.puts[start:start + size], self.spot, self.price)
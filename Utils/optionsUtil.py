@@ -1,12 +1,18 @@
 # Utility functions for options
-import urllib.request
-import json
 from datetime import datetime
 
 import sys, os
 parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(os.path.join(parent, "Formatting"))
 import messageParser as mp
+from Utils import httpClient
+from Utils import quoteCache
+from Utils.optionChain import OptionChain
+from Utils import greeks
+import numpy as np
+import asyncio
+import json
+import time
 
 
 '''
@@ -14,45 +20,134 @@ import messageParser as mp
 ## OVERVIEW ##
 ##############
 
-loadFrom(String url)
-	loads the data from the given URL
+All of the network-bound functions are coroutines, and need to be awaited
+
+loadFrom(String url, float ttl, boolean refresh)
+	loads the data from the given URL (from the cache if it's been loaded in the last ttl seconds)
 
-stocksPortfolioValue (list[String] array)
+getQuotes(list[String] symbols, int chunkSize, boolean refresh, float ttl)
+	Fetches the quotes for all the given symbols in as few requests as possible
+
+stocksPortfolioValue (dict positions, dict quotes)
 	Calculates the total portfolio value and changes
 
+optionsPortfolioValue (dict positions, dict quotes)
+	Calculates the total portfolio value and changes
+
+portfolioDelta(dict stocks, dict options, dict quotes)
+	Calculates the net dollar delta of the positions
+
+optionGreeks(String ticker, int expiration, boolean isCall, float strike, float iv)
+	Calculates the theoretical value and greeks of a contract
+
+sideGreeks(OptionSide side, float spot, boolean isCall)
+	Calculates the theoretical value and greeks of every contract in one side of a chain
+
+getExpirations(String ticker)
+	Returns the expiration dates (as timestamps) of the ticker's options
+
+getChain(String ticker, int timestamp)
+	Returns the full OptionChain for the given expiration
+
+getChainSurface(String ticker, int maxConcurrent)
+	Loads the chains for every expiration at once, and merges them into one OptionChain
 
 '''
 
 
+# Where Yahoo's API lives (point it at Utils/mockYahoo.py to run offline)
+YAHOO_URL = os.getenv("YAHOO_URL", "https://query1.finance.yahoo.com").rstrip("/")
+
 # the base URL
-baseURL = "https://query1.finance.yahoo.com/v7/finance/options/"
+baseURL = YAHOO_URL + "/v7/finance/options/"
+quoteURL = YAHOO_URL + "/v7/finance/quote?symbols="
+
+# The max number of symbols we ask Yahoo for in one quote request
+QUOTE_CHUNK_SIZE = 50
 
+# The max number of expirations getChainSurface fetches at once
+CHAIN_CONCURRENCY = 4
 
+# Caches quotes (by symbol) and everything else (by URL), up to QUOTE_CACHE_BYTES of responses
+cache = quoteCache.TTLCache(int(os.getenv("QUOTE_CACHE_BYTES", 16 * 1024 * 1024)))
 
-# loadFrom(String url)
+# symbol -> when it was last asked for (the market refresher keeps these warm)
+requested = {}
+# contract symbol -> when its option info (getOptionInfo) was last asked for (also kept warm)
+requestedOptions = {}
+
+
+
+# loadFrom(String url, float ttl, boolean refresh)
 # loads the data from the given URL
-def loadFrom(url):
-	with urllib.request.urlopen(url) as thisUrl:
-		return json.loads(thisUrl.read().decode())
+# If a ttl is given, the response is cached (by URL) for that many seconds
+# refresh skips the cache (the result is still cached for ttl seconds)
+async def loadFrom(url, ttl=None, refresh=False):
+	if ttl is not None and not refresh:
+		data = cache.get(url)
+		if data is not None:
+			return data
+
+	text = await httpClient.fetchText(url)
+	data = json.loads(text)
+
+	if ttl is not None:
+		cache.set(url, data, ttl, len(text))
+	return data
 
 
 
 
 
-# stocksPortfolioValue (list[String] array)
+# getQuotes(list[String] symbols, int chunkSize, boolean refresh, float ttl)
+# Fetches the quotes for all the given symbols in as few requests as possible
+# Returns a dict of symbol -> quote (symbols Yahoo doesn't know about are left out)
+# refresh skips the cache (the results are still cached for ttl seconds)
+async def getQuotes(symbols, chunkSize=QUOTE_CHUNK_SIZE, refresh=False, ttl=quoteCache.TTLS['quote']):
+	now = time.time()
+	quotes, missing = {}, []
+	for symbol in sorted(set(symbol.upper() for symbol in symbols)): # Dedupes the symbols
+		if not refresh:
+			requested[symbol] = now
+		quote = None if refresh else cache.get(("quote", symbol))
+		if quote is None:
+			missing.append(symbol)
+		else:
+			quotes[symbol] = quote
+
+	# The quote endpoint takes a comma-seperated list, so we only need one request per chunk
+	chunks = [missing[i:i + chunkSize] for i in range(0, len(missing), chunkSize)]
+	responses = await asyncio.gather(*[httpClient.fetchText(quoteURL + ",".join(chunk)) for chunk in chunks])
+
+	for text in responses:
+		result = json.loads(text)['quoteResponse']['result']
+		for quote in result:
+			quotes[quote['symbol']] = quote
+			cache.set(("quote", quote['symbol']), quote, ttl, len(text) // len(result))
+	return quotes
+
+
+
+
+
+# stocksPortfolioValue (dict positions, dict quotes)
 # Calculates the total portfolio value and changes
-def stocksPortfolioValue(array):
+# positions maps each symbol to its position ({'quantity': int, 'costBasis': float})
+# If a snapshot of quotes (from getQuotes) is given, it's used instead of fetching them
+async def stocksPortfolioValue(positions, quotes=None):
 	value = 0
 	change = 0
 	percentChange = 0
-	for stockGroup in array:
+	if quotes is None:
+		quotes = await getQuotes(positions.keys())
+	for symbol, position in positions.items():
 		try:
-			info = getStockInfo(stockGroup[0])
+			info = quotes[symbol.upper()]
 		except:
 			raise ValueError("Couldn't parse the ticker")
 
-		value += info['postMarketPrice'] * stockGroup[1]
-		change += info['postMarketChange'] *  stockGroup[1]
+		value += info['postMarketPrice'] * position['quantity']
+		change += info['postMarketChange'] *  position['quantity']
 		percentChange += info['postMarketChangePercent']
 
 	return round(value, 2), round(change, 2), round(percentChange, 2)
@@ -63,21 +158,30 @@ def stocksPortfolioValue(array):
 
 
 
-# optionsPortfolioValue (list[String] array)
+# optionsPortfolioValue (dict positions, dict quotes)
 # Calculates the total portfolio value and changes
-def optionsPortfolioValue(array):
+# positions maps each contract symbol to its position ({'quantity': int, 'costBasis': float})
+# If a snapshot of quotes (from getQuotes) is given, it's used instead of fetching them
+async def optionsPortfolioValue(positions, quotes=None):
 	value = 0
 	change = 0
 	percentChange = 0
-	for symbolGroup in array:
+	# Expired contracts are worthless, so they don't need a quote
+	positions = {symbol: position for symbol, position in positions.items()
+		if not mp.Contract.fromSymbol(symbol).isExpired()}
+
+	# The quote endpoint takes contract symbols as well, so options are batched the same way as stocks
+	if quotes is None:
+		quotes = await getQuotes(positions.keys())
+	for symbol, position in positions.items():
 		try:
-			info = mp.contractSymbolToData(symbolGroup[0])
+			info = quotes[symbol.upper()]
 		except:
 			raise ValueError("Couldn't parse the contract symbols")
 
-		value += info['lastPrice'] * 100 * symbolGroup[1]
-		change += info['change'] * 100 * symbolGroup[1]
-		percentChange += info['percentChange']
+		value += info['regularMarketPrice'] * 100 * position['quantity']
+		change += info['regularMarketChange'] * 100 * position['quantity']
+		percentChange += info['regularMarketChangePercent']
 	return round(value, 2), round(change, 2), round(percentChange, 2)
 
 
@@ -85,53 +189,133 @@ def optionsPortfolioValue(array):
 
 
 
-# getStrikeRange(List[int] strikes, int lastPrice, int num)
-# Returns "num" strike prices both above and below the lastPrice
-def getStrikeRange(strikes, lastPrice, num=5):
-	# Finds the strikes closest to the lastPrice
-	for i in range(num, len(strikes)-1):
-		if strikes[i] >= lastPrice:
-			strikesRange = [strikes[j] for j in range(i - num, i + num + 1)]
-			break
+# portfolioDelta(dict stocks, dict options, dict quotes)
+# Calculates the net dollar delta of the positions (how many dollars of stock the portfolio behaves like)
+# The options' IVs are solved from their last price, and contracts without a quote (or an underlying quote) are skipped
+def portfolioDelta(stocks, options, quotes):
+	delta = sum(quotes[symbol]['regularMarketPrice'] * position['quantity']
+		for symbol, position in stocks.items() if symbol in quotes)
+
+	contracts = [mp.Contract.fromSymbol(symbol) for symbol in options]
+	contracts = [c for c in contracts if not c.isExpired() and c.symbol in quotes and c.ticker in quotes]
+	if contracts:
+		spot = np.array([quotes[c.ticker]['regularMarketPrice'] for c in contracts])
+		strike = np.array([c.strike / 1000 for c in contracts])
+		t = greeks.yearsToExpiry([c.expiry.timestamp() for c in contracts])
+		isCall = np.array([c.optionType == "C" for c in contracts])
+		value = np.array([quotes[c.symbol]['regularMarketPrice'] for c in contracts])
+		quantity = np.array([options[c.symbol]['quantity'] for c in contracts])
+
+		# One batched solve and one batched greeks call for the whole book
+		vol = greeks.impliedVolatility(value, spot, strike, t, greeks.RISK_FREE_RATE, isCall)
+		contractDelta = greeks.greeks(spot, strike, t, greeks.RISK_FREE_RATE, vol, isCall)['delta']
+		delta += np.nansum(contractDelta * 100 * quantity * spot)
+
+	return round(float(delta), 2)
+
+
+
+
+
 
-	return strikesRange
 
+# optionGreeks(String ticker, int expiration, boolean isCall, float strike, float iv)
+# Calculates the theoretical value and greeks of a contract (from Yahoo's IV)
+# Returns a dict of floats (see greeks.greeks)
+async def optionGreeks(ticker, expiration, isCall, strike, iv):
+	spot = (await getStockInfo(ticker))['regularMarketPrice']
+	t = greeks.yearsToExpiry(expiration)
+	return {name: float(value) for name, value in greeks.greeks(spot, strike, t, greeks.RISK_FREE_RATE, iv, isCall).items()}
 
 
 
 
 
 
-# getChainAtDate(String ticker, int timestamp)
-# Takes a ticker and a timestamp, and gets 5 options above and below the strike price
-def getChainAtDate(ticker, timestamp):
+
+# sideGreeks(OptionSide side, float spot, boolean isCall)
+# Calculates the theoretical value and greeks of every contract in one side of a chain (from Yahoo's IVs)
+# Returns a dict of arrays (see greeks.greeks)
+def sideGreeks(side, spot, isCall):
+	t = greeks.yearsToExpiry(side.expiration)
+	return greeks.greeks(spot, side.strike, t, greeks.RISK_FREE_RATE, side.iv, isCall)
+
+
+
+
+
+
+
+# getExpirations(String ticker)
+# Returns the expiration dates (as timestamps) of the ticker's options
+async def getExpirations(ticker):
+	try:
+		return (await loadFrom(baseURL + ticker, quoteCache.TTLS['dates']))['optionChain']['result'][0]['expirationDates']
+	except:
+		raise ValueError("Could not load data from URL")
+
+
+
+
+
+# getChain(String ticker, int timestamp)
+# Returns the full OptionChain for the given expiration
+async def getChain(ticker, timestamp):
 	url = baseURL + ticker + "?date=" + str(timestamp)
 
 	# Loads all the data
 	try: 
-		data = loadFrom(url)['optionChain']['result'][0]
-		options, strikes, lastPrice = data['options'][0], data['strikes'], data['quote']['regularMarketPreviousClose']
+		data = (await loadFrom(url, quoteCache.TTLS['chain']))['optionChain']['result'][0]
+		chain = OptionChain.fromJSON(data)
 	except:
 		raise ValueError("No data found")
 
-	strikesRange = getStrikeRange(strikes, lastPrice)
+	chain.calls.expiration[:] = timestamp
+	chain.puts.expiration[:] = timestamp
+	return chain
 
-	# Grabs all the options with the aforementioned strikesRange
-	calls = [option for option in options['calls'] if option['strike'] in strikesRange]
-	puts = [option for option in options['puts'] if option['strike'] in strikesRange]
 
-	return calls, puts
 
 
 
+# getChainAtDate(String ticker, int timestamp, int width)
+# Takes a ticker and a timestamp, and gets "width" options above and below the strike price
+# Returns an OptionChain, with the calls and puts lined up by strike (strikes missing a call or a put are left out)
+async def getChainAtDate(ticker, timestamp, width=5):
+	return (await getChain(ticker, timestamp)).aligned().window(width)
 
 
 
-# getOptionInfo(string contractSymbol)
+
+
+# getChainSurface(String ticker, int maxConcurrent)
+# Loads the chains for every expiration at once (at most maxConcurrent at a time), and merges them into one OptionChain
+# Use the expiration column to tell the expirations apart
+async def getChainSurface(ticker, maxConcurrent=CHAIN_CONCURRENCY):
+	semaphore = asyncio.Semaphore(maxConcurrent)
+
+	async def load(timestamp):
+		async with semaphore:
+			return await getChain(ticker, timestamp)
+
+	chains = await asyncio.gather(*[load(timestamp) for timestamp in await getExpirations(ticker)])
+	if len(chains) == 0:
+		raise ValueError("No data found")
+	return OptionChain.concat(chains)
+
+
+
+
+
+
+# getOptionInfo(string contractSymbol, boolean refresh, float ttl)
 # Given a string, it parses it and returns the corresponding option
-def getOptionInfo(contractSymbol):
+# refresh skips the cache (the result is still cached for ttl seconds)
+async def getOptionInfo(contractSymbol, refresh=False, ttl=quoteCache.TTLS['quote']):
+	if not refresh:
+		requestedOptions[contractSymbol] = time.time()
 	url = baseURL + contractSymbol
-	data = loadFrom(url)['optionChain']['result'][0]
+	data = (await loadFrom(url, ttl, refresh))['optionChain']['result'][0]
 	return data
 
 
@@ -142,9 +326,11 @@ def getOptionInfo(contractSymbol):
 
 # getStockInfo(String ticker)
 # Given a string, it parses it and returns the corresponding stock
-def getStockInfo(ticker):
-	url = "https://query1.finance.yahoo.com/v7/finance/quote?symbols=" + ticker
-	return loadFrom(url)['quoteResponse']['result'][0]
+async def getStockInfo(ticker):
+	try:
+		return (await getQuotes([ticker]))[ticker.upper()]
+	except KeyError:
+		raise ValueError("No data found for {0}".format(ticker))
 
 
 
@@ -153,7 +339,7 @@ def getStockInfo(ticker):
 
 # getChartInfo (String string)
 # given a stirng as input, it splits and parses it using parseDurationInfo and getOptionInfo
-def getChartInfo(string):
+async def getChartInfo(string):
 	string = string.upper()
 	time = string.split(" ")[-1]
 
@@ -165,18 +351,15 @@ def getChartInfo(string):
 	try:
 		contractInfo = string.replace(time, '')
 		t, d, o, s, cS = mp.parseContractInfo(contractInfo)
-		optionsInfo = getOptionInfo(cS)
+		optionsInfo = await getOptionInfo(cS)
 	except:
 		raise ValueError("Couldn't parse the option info")
 	return num, optionsInfo
 
 # getChainDates (String ticker)
 # Given the database, formats and prints the optionchain
-def getChainDates(ticker):
-	try:
-		data = loadFrom(baseURL + ticker)['optionChain']['result'][0]['expirationDates']
-	except:
-		raise ValueError("Could not load data from URL")
+async def getChainDates(ticker):
+	data = await getExpirations(ticker)
 
 	result = ""
 	for datum in data:
@@ -197,25 +380,28 @@ def getChainDates(ticker):
 
 # printChain(String ticker, int timestamp)
 # Adds the given chain to the given embed, and returns the altered embed
-def printChain(ticker, timestamp):
+async def printChain(ticker, timestamp):
 	try:
-		calls, puts = getChainAtDate(ticker, timestamp)
+		chain = await getChainAtDate(ticker, timestamp)
 	except:
 		raise ValueError("No data found for input")
 
+	# Every row's delta in one go (at the current price - the window is still centred on the previous close)
+	deltas = [sideGreeks(chain.calls, chain.price, True)['delta'], sideGreeks(chain.puts, chain.price, False)['delta']]
+
 	strikes, values = [], []
-	for i in range(0, len(calls)-1):
+	for i in range(len(chain.calls)):
 		# Formats the information displayed for each option
 		value = ""
-		for type in [calls, puts]:
-			price = "**__Price__**: ${0}".format(round(type[i]['lastPrice'], 2))
-			change = "{0}%".format(round(type[i]['percentChange'], 2))
-			vol = "**__Vol / OI__**: {0} / {1}".format(type[i]['volume'], type[i]['openInterest'])
+		for side, delta in zip([chain.calls, chain.puts], deltas):
+			price = "**__Price__**: ${0}".format(round(side.last[i], 2))
+			change = "{0}%".format(round(side.percentChange[i], 2))
+			vol = "**__Vol / OI__**: {0} / {1}".format(side.volume[i], side.openInterest[i])
 
-			value += "{0} ({1}),  {2}\n".format(price, change, vol)
+			value += "{0} ({1}),  {2},  **__Delta__**: {3}\n".format(price, change, vol, round(delta[i], 2))
 
 		values.append(value)
-		strikes.append("Strike: {}".format(calls[i]['strike']))
+		strikes.append("Strike: {}".format(chain.calls.strike[i]))
 	return values, strikes
 
 
@@ -0,0 +1,94 @@
+# In-process cache for the data we get from Yahoo
+from collections import OrderedDict
+import time
+
+
+'''
+##############
+## OVERVIEW ##
+##############
+
+TTLCache(int maxBytes, function clock)
+	A least-recently-used cache where every entry expires after its own TTL
+
+TTLCache.get(key)
+	Returns the cached value for the key (or None if it's missing or expired)
+
+TTLCache.set(key, value, float ttl, int size)
+	Caches the value for ttl seconds, evicting the least recently used entries if needed
+
+TTLCache.stats()
+	Returns the hit/miss counters and the current size of the cache
+
+'''
+
+
+# How long (in seconds) each type of data stays fresh
+TTLS = {"quote": 15, "chain": 60, "dates": 60 * 60}
+
+
+
+class TTLCache:
+	# (int maxBytes, function clock)
+	# maxBytes caps the (estimated) size of everything in the cache
+	def __init__(self, maxBytes, clock=time.monotonic):
+		self.maxBytes = maxBytes
+		self.clock = clock
+		self.entries = OrderedDict() # key -> (expires, size, value), oldest first
+		self.bytes = 0
+		self.hits = 0
+		self.misses = 0
+
+
+
+	# get(key)
+	# Returns the cached value for the key (or None if it's missing or expired)
+	def get(self, key):
+		entry = self.entries.get(key)
+		if entry is None or entry[0] <= self.clock():
+			self.misses += 1
+			return None
+
+		self.entries.move_to_end(key) # Marks it as recently used
+		self.hits += 1
+		return entry[2]
+
+
+
+	# set(key, value, float ttl, int size)
+	# Caches the value for ttl seconds, evicting the least recently used entries if needed
+	def set(self, key, value, ttl, size=1):
+		self.pop(key)
+		if size > self.maxBytes:
+			return # Would just evict everything else
+
+		self.entries[key] = (self.clock() + ttl, size, value)
+		self.bytes += size
+
+		while self.bytes > self.maxBytes:
+			oldest, (expires, oldSize, oldValue) = self.entries.popitem(last=False)
+			self.bytes -= oldSize
+
+
+
+	# pop(key)
+	# Removes the key from the cache (if it exists)
+	def pop(self, key):
+		entry = self.entries.pop(key, None)
+		if entry is not None:
+			self.bytes -= entry[1]
+
+
+
+	# clear()
+	# Empties the cache (the counters are kept)
+	def clear(self):
+		self.entries.clear()
+		self.bytes = 0
+
+
+
+	# stats()
+	# Returns the hit/miss counters and the current size of the cache
+	def stats(self):
+		return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "bytes": self.bytes}
@@ -1,4 +1,20 @@
-import optionsUtil as ou
+from Utils import optionsUtil as ou # The same module marketRefresher uses (so they share the cache)
+import quoteCache as qc
+from ledger import Ledger
+from barStore import BarStore
+from mockYahoo import MockYahoo
+from optionChain import OptionChain
+from marketRefresher import MarketRefresher, MARKET_TZ
+import trading
+import generateChart as gc
+import greeks
+import numpy as np
+from datetime import datetime, timezone
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
 import unittest
 
 
@@ -9,14 +25,23 @@ SPY, SPX, DJIA, COMP
 Seeing as I don't foresee a complete global economic collapse in the next couple of years, 
 if the tests fail, it is more than likely due to the Yahoo API changing (or me breaking a method).
 (ie. these tickers should always work)
+
+To run them offline, start Utils/mockYahoo.py and set YAHOO_URL to it (TestMockYahoo starts its own)
 '''
 
 class TestLoadFrom(unittest.TestCase):
 	def setUp(self):
-		self.d1 = ou.loadFrom("https://query1.finance.yahoo.com/v7/finance/quote?symbols=SPY")
-		self.d2 = ou.loadFrom("https://query1.finance.yahoo.com/v7/finance/quote?symbols=SPX")
-		self.d3 = ou.loadFrom("https://query1.finance.yahoo.com/v7/finance/quote?symbols=DJIA")
-		self.d4 = ou.loadFrom("https://query1.finance.yahoo.com/v7/finance/quote?symbols=COMP")
+		self.d1, self.d2, self.d3, self.d4 = asyncio.run(self.loadAll())
+
+	async def loadAll(self):
+		try:
+			return await asyncio.gather(
+				ou.loadFrom(ou.quoteURL + "SPY"),
+				ou.loadFrom(ou.quoteURL + "SPX"),
+				ou.loadFrom(ou.quoteURL + "DJIA"),
+				ou.loadFrom(ou.quoteURL + "COMP"))
+		finally:
+			await ou.httpClient.close()
 		
 	def testLoad(self):
 		self.setUp()
@@ -26,6 +51,522 @@ class TestLoadFrom(unittest.TestCase):
 		self.assertEqual(self.d4['quoteResponse']['result'][0]['symbol'], "COMP")
 
 
+class TestGetQuotes(unittest.TestCase):
+	def setUp(self):
+		self.q1 = asyncio.run(self.load(["SPY", "SPX", "spy", "DJIA"]))
+		self.q2 = asyncio.run(self.load(["SPY", "SPX", "DJIA", "COMP"], chunkSize=1))
+
+	async def load(self, symbols, chunkSize=ou.QUOTE_CHUNK_SIZE):
+		try:
+			return await ou.getQuotes(symbols, chunkSize=chunkSize)
+		finally:
+			await ou.httpClient.close()
+
+	def testDedupe(self):
+		self.setUp()
+		self.assertEqual(sorted(self.q1.keys()), ["DJIA", "SPX", "SPY"])
+
+	def testChunks(self):
+		self.setUp()
+		self.assertEqual(sorted(self.q2.keys()), ["COMP", "DJIA", "SPX", "SPY"])
+
+
+class TestOptionChain(unittest.TestCase):
+	def setUp(self):
+		calls = [{"strike": s, "bid": 1.0, "ask": 1.0 + s / 1000, "lastPrice": 1.0, "volume": s, "openInterest": 1}
+			for s in range(100, 200, 5)]
+		puts = [{"strike": s, "bid": 1.0, "ask": 1.5, "lastPrice": 2.0} for s in range(100, 200, 5) if s != 150]
+		self.chain = OptionChain.fromJSON({"options": [{"calls": calls, "puts": puts}],
+			"quote": {"regularMarketPreviousClose": 151, "regularMarketPrice": 153}})
+
+	def testAligned(self):
+		self.setUp()
+		aligned = self.chain.aligned()
+		self.assertEqual(len(aligned.calls), 19)
+		self.assertEqual(list(aligned.calls.strike), list(aligned.puts.strike))
+
+	def testWindow(self):
+		self.setUp()
+		window = self.chain.aligned().window(2)
+		self.assertEqual(list(window.calls.strike), [140, 145, 155, 160, 165])
+		self.assertEqual(list(window.puts.last), [2.0] * 5)
+		self.assertEqual(list(window.calls.volume), [140, 145, 155, 160, 165])
+		self.assertEqual((window.spot, window.price), (151, 153)) # Centred on the previous close, priced at 153
+
+	def testConcat(self):
+		self.setUp()
+		merged = OptionChain.concat([self.chain, self.chain.aligned().window(2)])
+		self.assertEqual(len(merged.calls), 25)
+		self.assertEqual(len(merged.puts), 24)
+
+	def testFilters(self):
+		self.setUp()
+		self.assertEqual(list(self.chain.calls.filterMoneyness(150, 0.9, 1.1).strike), list(range(135, 170, 5)))
+		self.assertEqual(len(self.chain.calls.minVolume(190)), 2)
+		self.assertEqual(list(self.chain.calls.maxSpread(0.111).strike), [100, 105, 110])
+		self.assertEqual(list(self.chain.puts.volume[:2]), [0, 0]) # Missing from the JSON
+
+	# Builds an aligned chain with the given strikes
+	def strikeChain(self, strikes, spot):
+		options = [{"strike": s} for s in strikes]
+		return OptionChain.fromJSON({"options": [{"calls": options, "puts": options}],
+			"quote": {"regularMarketPreviousClose": spot}})
+
+	def testWindowMiddle(self):
+		self.setUp()
+		strikes = range(100, 200, 5)
+		self.assertEqual(list(self.strikeChain(strikes, 151).window(2).calls.strike), [145, 150, 155, 160, 165])
+		self.assertEqual(list(self.strikeChain(strikes, 150).window(2).calls.strike), [140, 145, 150, 155, 160])
+
+	def testWindowEdges(self):
+		self.setUp()
+		strikes = range(100, 200, 5)
+		# Shifted so it still holds 2 * width + 1 strikes
+		self.assertEqual(list(self.strikeChain(strikes, 50).window(2).calls.strike), [100, 105, 110, 115, 120])
+		self.assertEqual(list(self.strikeChain(strikes, 500).window(2).calls.strike), [175, 180, 185, 190, 195])
+		self.assertEqual(list(self.strikeChain([100, 105], 102).window(5).calls.strike), [100, 105])
+
+class TestMarketRefresher(unittest.TestCase):
+	def setUp(self):
+		self.refresher = MarketRefresher(lambda: ["SPY"])
+
+	def testCadence(self):
+		self.setUp()
+		regular = self.refresher.cadence(datetime(2020, 4, 17, 10, 0, tzinfo=MARKET_TZ)) # A Friday
+		premarket = self.refresher.cadence(datetime(2020, 4, 17, 8, 0, tzinfo=MARKET_TZ))
+		weekend = self.refresher.cadence(datetime(2020, 4, 18, 10, 0, tzinfo=MARKET_TZ))
+		self.assertLess(regular, premarket)
+		self.assertLess(premarket, weekend)
+
+	def testHotOptions(self):
+		self.setUp()
+		now = datetime.now().timestamp()
+		ou.requestedOptions.update({"SPY200417C00300000": now, "SPY200417P00300000": now - 2 * self.refresher.recentWindow})
+		try:
+			self.assertEqual(self.refresher.hotOptions(), {"SPY200417C00300000"})
+			self.assertNotIn("SPY200417P00300000", ou.requestedOptions) # Pruned
+		finally:
+			ou.requestedOptions.clear()
+
+class TestTTLCache(unittest.TestCase):
+	def setUp(self):
+		self.now = 0
+		self.cache = qc.TTLCache(maxBytes=10, clock=lambda: self.now)
+
+	def testExpiry(self):
+		self.setUp()
+		self.cache.set("SPY", 1, ttl=15)
+		self.cache.set("dates", 2, ttl=3600)
+		self.now = 20
+		self.assertEqual(self.cache.get("SPY"), None)
+		self.assertEqual(self.cache.get("dates"), 2)
+
+	def testEviction(self):
+		self.setUp()
+		self.cache.set("SPY", 1, ttl=15, size=4)
+		self.cache.set("SPX", 2, ttl=15, size=4)
+		self.cache.get("SPY") # SPX is now the least recently used
+		self.cache.set("DJIA", 3, ttl=15, size=4)
+		self.assertEqual(self.cache.get("SPX"), None)
+		self.assertEqual(self.cache.get("SPY"), 1)
+		self.assertEqual(self.cache.bytes, 8)
+
+	def testCounters(self):
+		self.setUp()
+		self.cache.set("SPY", 1, ttl=15)
+		self.cache.get("SPY")
+		self.cache.get("COMP")
+		self.assertEqual(self.cache.stats()['hits'], 1)
+		self.assertEqual(self.cache.stats()['misses'], 1)
+
+
+class TestLedger(unittest.TestCase):
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.db = os.path.join(self.dir, "currency.db")
+		self.json = os.path.join(self.dir, "currency.json")
+		with open(self.json, "w") as f:
+			json.dump({"name": "USD", "1": {"currency": 100, "symbols": [], "stocks": [["SPY", 2]]}}, f)
+
+	def testImport(self):
+		self.setUp()
+		Ledger(self.db, importFrom=self.json)
+		self.assertEqual(Ledger(self.db).data["1"]["stocks"], [["SPY", 2]])
+
+	def testSave(self):
+		self.setUp()
+		l1 = Ledger(self.db, importFrom=self.json)
+		l1.data["1"]["currency"] = 50
+		l1.data["2"] = {"currency": 10, "symbols": [], "stocks": []}
+		l1.save("2") # User 1 isn't saved
+		l2 = Ledger(self.db)
+		self.assertEqual(l2.data["1"]["currency"], 100)
+		self.assertEqual(l2.data["2"]["currency"], 10)
+
+	def testFlush(self):
+		self.setUp()
+		l1 = Ledger(self.db, importFrom=self.json)
+		l1.data["1"]["currency"] = 50
+		l1.markDirty("1")
+		self.assertEqual(Ledger(self.db).data["1"]["currency"], 100) # Not written yet
+		l1.flush()
+		self.assertEqual(Ledger(self.db).data["1"]["currency"], 50)
+		self.assertEqual(l1.dirty, set())
+
+	def testFlushLoopRetries(self):
+		self.setUp()
+		l1 = Ledger(self.db, importFrom=self.json)
+		write, failures = l1.write, []
+		def flakyWrite(rows):
+			if not failures:
+				failures.append(rows)
+				raise sqlite3.OperationalError("database is locked")
+			write(rows)
+		l1.write = flakyWrite
+
+		async def run():
+			task = asyncio.ensure_future(l1.flushLoop(interval=0.01))
+			l1.data["1"]["currency"] = 50
+			l1.markDirty("1")
+			await asyncio.sleep(0.1)
+			task.cancel()
+			return task
+
+		with self.assertLogs("ledger", level="ERROR"):
+			task = asyncio.run(run())
+		self.assertEqual(len(failures), 1)
+		self.assertTrue(task.cancelled()) # Still running after the failure
+		self.assertEqual(Ledger(self.db).data["1"]["currency"], 50)
+		self.assertEqual(l1.dirty, set())
+
+
+
+
+class TestTrading(unittest.TestCase):
+	def setUp(self):
+		self.data = {"currency": 1000, "symbols": {}, "stocks": {"SPY": {"quantity": 4, "costBasis": 400}}}
+
+	def testMerge(self):
+		self.setUp()
+		merged = trading.mergePositions([["spy", 2], ["SPY", 3], ["DJIA", 1]])
+		self.assertEqual(merged, {"SPY": {"quantity": 5, "costBasis": 0}, "DJIA": {"quantity": 1, "costBasis": 0}})
+
+	def testMigrate(self):
+		self.setUp()
+		ledger = Ledger(os.path.join(tempfile.mkdtemp(), "currency.db"))
+		ledger.data.update({"name": "USD", "1": {"currency": 0, "symbols": [], "stocks": [["SPY", 2], ["spy", 1]]}})
+		trading.migrate(ledger)
+		self.assertEqual(ledger.data["1"]["stocks"], {"SPY": {"quantity": 3, "costBasis": 0}})
+		self.assertEqual(ledger.data["1"]["symbols"], {})
+		self.assertEqual(ledger.dirty, {"1"})
+
+	def testBuy(self):
+		self.setUp()
+		trading.buySymbol(self.data, ("stocks", "SPY", 1, 150))
+		self.assertEqual(self.data["stocks"]["SPY"], {"quantity": 5, "costBasis": 550})
+		self.assertEqual(self.data["currency"], 850)
+		with self.assertRaises(trading.OrderRejected):
+			trading.buySymbol(self.data, ("stocks", "DJIA", 1, 900))
+		self.assertNotIn("DJIA", self.data["stocks"])
+		self.assertEqual(self.data["currency"], 850)
+
+	def testPartialSell(self):
+		self.setUp()
+		trading.sellSymbol(self.data, ("stocks", "SPY", 1, 120))
+		# The cost basis goes down in proportion to what's sold
+		self.assertEqual(self.data["stocks"]["SPY"], {"quantity": 3, "costBasis": 300})
+		self.assertEqual(self.data["currency"], 1120)
+
+	def testOverSell(self):
+		self.setUp()
+		with self.assertRaises(trading.OrderRejected):
+			trading.sellSymbol(self.data, ("stocks", "SPY", 5, 600))
+		with self.assertRaises(trading.OrderRejected):
+			trading.sellSymbol(self.data, ("stocks", "DJIA", 1, 100))
+		self.assertEqual(self.data["stocks"], {"SPY": {"quantity": 4, "costBasis": 400}})
+		self.assertEqual(self.data["currency"], 1000)
+
+	def testFullSell(self):
+		self.setUp()
+		trading.sellSymbol(self.data, ("stocks", "SPY", 4, 480))
+		self.assertEqual(self.data["stocks"], {})
+		self.assertEqual(self.data["currency"], 1480)
+
+
+
+
+class TestExtrapolate(unittest.TestCase):
+	def setUp(self):
+		self.chart = gc.Chart.__new__(gc.Chart) # Without drawing anything
+
+	def testGaps(self):
+		self.setUp()
+		filled = self.chart.extrapolateData([None, None, 3, None, 5, None, None], 2)
+		# Leading blanks are the previous close, and everything else carries the last value forward
+		self.assertEqual(list(filled), [2, 2, 3, 3, 5, 5, 5])
+
+	def testEdges(self):
+		self.setUp()
+		self.assertEqual(list(self.chart.extrapolateData([None, None], 7)), [7, 7])
+		self.assertEqual(list(self.chart.extrapolateData([1, 2], 7)), [1, 2])
+		self.assertEqual(len(self.chart.extrapolateData([], 7)), 0)
+
+	def testGetData(self):
+		self.setUp()
+		data = {"chart": {"result": [{"timestamp": [0, 60, 120], "meta": {"chartPreviousClose": 4},
+			"indicators": {"quote": [{"close": [None, 6, None], "volume": [1, None, 3]}]}}]}}
+		dates, price, volume = self.chart.getData(data)
+		self.assertEqual(list(price), [4, 6, 6]) # Falls back on chartPreviousClose
+		self.assertEqual(list(volume), [1, 0, 3])
+		self.assertEqual(dates[1], np.datetime64(60, "s"))
+
+
+
+
+class TestDownsample(unittest.TestCase):
+	def setUp(self):
+		self.x = np.arange(1000, dtype=float)
+		self.y = np.sin(self.x / 50)
+		self.y[437] = 10 # A spike, which has to survive
+		self.y[612] = -10 # A dip
+
+	def testShort(self):
+		self.setUp()
+		self.assertEqual(list(gc.lttb(self.x[:50], self.y[:50], 50)), list(range(50)))
+		self.assertEqual(list(gc.lttb(self.x[:50], self.y[:50], 80)), list(range(50)))
+		self.assertEqual(list(gc.minMax(self.y[:50], 25)), list(range(50)))
+		self.assertEqual(list(gc.minMax(self.y[:50], 40)), list(range(50)))
+
+	def testLTTB(self):
+		self.setUp()
+		index = gc.lttb(self.x, self.y, 100)
+		self.assertEqual(len(index), 100)
+		self.assertEqual((index[0], index[-1]), (0, 999))
+		self.assertTrue((np.diff(index) > 0).all())
+		self.assertIn(437, index)
+		self.assertIn(612, index)
+
+	def testLTTBBuckets(self):
+		self.setUp()
+		# Everything between the first and last point is split into threshold - 2 buckets, with one point from each
+		index = gc.lttb(self.x, self.y, 10)
+		edges = np.linspace(1, 999, 9).astype(int)
+		for i, point in enumerate(index[1:-1]):
+			self.assertTrue(edges[i] <= point < edges[i + 1])
+
+	def testMinMax(self):
+		self.setUp()
+		index = gc.minMax(self.y, 10)
+		self.assertEqual((index[0], index[-1]), (0, 999))
+		self.assertTrue((np.diff(index) > 0).all())
+		self.assertLessEqual(len(index), 2 * 10 + 2)
+		self.assertIn(437, index)
+		self.assertIn(612, index)
+		# The lowest and highest point of every bucket
+		edges = np.linspace(0, 1000, 11).astype(int)
+		for start, end in zip(edges[:-1], edges[1:]):
+			self.assertIn(start + np.argmin(self.y[start:end]), index)
+			self.assertIn(start + np.argmax(self.y[start:end]), index)
+
+
+
+
+class TestGreeks(unittest.TestCase):
+	def setUp(self):
+		self.spot, self.strike, self.t, self.rate, self.vol = 100.0, 100.0, 1.0, 0.05, 0.2
+
+	def testPrice(self):
+		self.setUp()
+		self.assertAlmostEqual(float(greeks.price(self.spot, self.strike, self.t, self.rate, self.vol, True)), 10.4506, 3)
+		self.assertAlmostEqual(float(greeks.price(self.spot, self.strike, self.t, self.rate, self.vol, False)), 5.5735, 3)
+
+	def testParity(self):
+		self.setUp()
+		strikes = np.array([80.0, 100.0, 120.0])
+		calls = greeks.greeks(self.spot, strikes, self.t, self.rate, self.vol, True)
+		puts = greeks.greeks(self.spot, strikes, self.t, self.rate, self.vol, False)
+		parity = self.spot - strikes * np.exp(-self.rate * self.t)
+		np.testing.assert_allclose(calls["value"] - puts["value"], parity, atol=1e-6)
+		np.testing.assert_allclose(calls["delta"] - puts["delta"], 1, atol=1e-9)
+		np.testing.assert_allclose(calls["gamma"], puts["gamma"])
+
+	def testImpliedVolatility(self):
+		self.setUp()
+		strikes = np.array([80.0, 100.0, 120.0, 100.0])
+		vols = np.array([0.15, 0.3, 0.6, 0.9])
+		isCall = np.array([True, False, True, False])
+		values = greeks.price(self.spot, strikes, self.t, self.rate, vols, isCall)
+		solved = greeks.impliedVolatility(values, self.spot, strikes, self.t, self.rate, isCall)
+		np.testing.assert_allclose(solved, vols, atol=1e-4)
+		# Below intrinsic value, so no volatility fits
+		self.assertTrue(np.isnan(greeks.impliedVolatility(1.0, self.spot, 80.0, self.t, self.rate, True)))
+
+
+
+
+# Builds a v8-style chart response
+def chartResponse(timestamps, closes, previousClose):
+	return {"chart": {"result": [{"meta": {"chartPreviousClose": previousClose}, "timestamp": timestamps,
+		"indicators": {"quote": [{"close": closes, "volume": [10] * len(closes)}]}}], "error": None}}
+
+
+class TestBarStore(unittest.TestCase):
+	def setUp(self):
+		self.bars = BarStore(os.path.join(tempfile.mkdtemp(), "bars.db"))
+		self.bars.add("SPY", "1d", 100, 400, chartResponse([100, 200, 300, 400], [1, 2, None, 4], 0.5))
+
+	def testMissing(self):
+		self.setUp()
+		self.assertEqual(self.bars.missing("QQQ", "1d", 100, 500), [(100, 500)])
+		self.assertEqual(self.bars.missing("SPY", "1d", 200, 400), [])
+		# The tail starts at the last stored bar, which may have changed
+		self.assertEqual(self.bars.missing("SPY", "1d", 200, 600), [(400, 600)])
+		self.assertEqual(self.bars.missing("SPY", "1d", 200, 600, freshFor=300), [])
+		self.assertEqual(self.bars.missing("SPY", "1d", 0, 600), [(0, 100), (400, 600)])
+		# Past the stored range - no gap is left
+		self.assertEqual(self.bars.missing("SPY", "1d", 700, 800), [(700, 800)])
+
+	def testRead(self):
+		self.setUp()
+		result = self.bars.read("SPY", "1d", 200, 400)['chart']['result'][0]
+		self.assertEqual(result['timestamp'], [200, 300, 400])
+		self.assertEqual(result['indicators']['quote'][0]['close'], [2, None, 4])
+		self.assertEqual(result['meta']['chartPreviousClose'], 1)
+		self.assertEqual(self.bars.read("SPY", "1d", 100, 400)['chart']['result'][0]['meta']['chartPreviousClose'], 0.5)
+		self.assertNotIn('timestamp', self.bars.read("QQQ", "1d", 100, 400)['chart']['result'][0])
+
+	def testAdd(self):
+		self.setUp()
+		self.bars.add("SPY", "1d", 400, 600, chartResponse([400, 500, 600], [4.5, 5, 6], 2))
+		self.bars.add("SPY", "1d", 0, 100, chartResponse([0, 100], [0.25, 1], 0.1))
+		self.assertEqual(self.bars.coverage("SPY", "1d"), (0, 600, 0.1))
+		result = self.bars.read("SPY", "1d", 0, 600)['chart']['result'][0]
+		self.assertEqual(result['indicators']['quote'][0]['close'], [0.25, 1, 2, None, 4.5, 5, 6])
+
+
+
+
+class TestMockYahoo(unittest.TestCase):
+	def setUp(self):
+		self.baseURL, self.quoteURL = ou.baseURL, ou.quoteURL
+		ou.cache.clear()
+
+	def tearDown(self):
+		ou.baseURL, ou.quoteURL = self.baseURL, self.quoteURL
+		ou.cache.clear()
+
+	# Runs the coroutine (built by makeCall) against a mock server (kept as self.mock)
+	def withMock(self, makeCall, **kwargs):
+		self.mock = MockYahoo(**kwargs)
+		async def run():
+			runner = await self.mock.start()
+			host, port = runner.addresses[0][:2]
+			ou.baseURL = "http://{0}:{1}/v7/finance/options/".format(host, port)
+			ou.quoteURL = "http://{0}:{1}/v7/finance/quote?symbols=".format(host, port)
+			try:
+				return await makeCall()
+			finally:
+				await ou.httpClient.close()
+				await runner.cleanup()
+		return asyncio.run(run())
+
+	def testQuotes(self):
+		self.setUp()
+		quotes = self.withMock(lambda: ou.getQuotes(["SPY", "spy", "DJIA"], chunkSize=1))
+		self.assertEqual(sorted(quotes.keys()), ["DJIA", "SPY"])
+		# Always the same for the same seed
+		self.assertEqual(quotes["SPY"]["regularMarketPrice"], MockYahoo().quote("SPY")["regularMarketPrice"])
+		# The previous close stays close to the spot
+		self.assertLessEqual(abs(quotes["SPY"]["regularMarketChangePercent"]), 2.1)
+
+	def testChain(self):
+		self.setUp()
+		async def load():
+			expirations = await ou.getExpirations("SPY")
+			return expirations, await ou.getChainAtDate("SPY", expirations[1], width=3)
+		expirations, chain = self.withMock(load)
+		self.assertEqual(len(chain.calls), 7)
+		self.assertEqual(list(chain.calls.strike), list(chain.puts.strike))
+		self.assertTrue((chain.calls.expiration == expirations[1]).all())
+
+	def testSurface(self):
+		self.setUp()
+		async def load():
+			expirations = await ou.getExpirations("SPY")
+			surface = await ou.getChainSurface("SPY", maxConcurrent=2)
+			before = self.mock.requests
+			await ou.getChainSurface("SPY") # Served from the cache
+			return expirations, surface, self.mock.requests - before
+		expirations, surface, requests = self.withMock(load)
+		self.assertEqual(sorted(set(surface.calls.expiration)), sorted(expirations))
+		self.assertEqual(sorted(set(surface.puts.expiration)), sorted(expirations))
+		self.assertEqual(requests, 0)
+
+	def testOption(self):
+		self.setUp()
+		symbol = ou.mp.Contract("SPY", datetime.fromtimestamp(MockYahoo().expirations()[0], tz=timezone.utc),
+			"C", 300000).symbol
+		info = self.withMock(lambda: ou.getOptionInfo(symbol))
+		self.assertEqual(info["contractSymbol"], symbol)
+		self.assertEqual(info["strike"], 300)
+
+	def testChart(self):
+		self.setUp()
+		mock = MockYahoo()
+		whole = mock.chart("SPY", 1614556800, 1614988800, "5m")['chart']['result'][0]
+		part = mock.chart("SPY", 1614729600, 1614988800, "5m")['chart']['result'][0]
+		self.assertEqual(part['indicators']['quote'][0]['close'],
+			whole['indicators']['quote'][0]['close'][-len(part['timestamp']):])
+
+	def testRefreshOptions(self):
+		self.setUp()
+		symbol = ou.mp.Contract("SPY", datetime.fromtimestamp(MockYahoo().expirations()[0], tz=timezone.utc),
+			"C", 300000).symbol
+		async def refresh():
+			ou.requestedOptions[symbol] = datetime.now().timestamp()
+			await MarketRefresher(lambda: []).refresh()
+			return ou.cache.get(ou.baseURL + symbol)
+		try:
+			cached = self.withMock(refresh)
+		finally:
+			ou.requestedOptions.clear()
+		# !op reads the warmed entry from the cache
+		self.assertEqual(cached['optionChain']['result'][0]['contractSymbol'], symbol)
+
+	def testConcurrentBuys(self):
+		self.setUp()
+		price = MockYahoo().quote("SPY")["regularMarketPrice"]
+		ledger = Ledger(os.path.join(tempfile.mkdtemp(), "currency.db"))
+		ledger.data["1"] = {"currency": round(price * 1.5, 2), "symbols": {}, "stocks": {}}
+		# Both are sent together (and the latency keeps their quotes in flight together), but only one can be afforded
+		buys = lambda: asyncio.gather(*[trading.placeOrder(ledger, "1", ["SPY"], 1, trading.buySymbol) for i in range(2)],
+			return_exceptions=True)
+		first, second = self.withMock(buys, latency=0.05)
+		self.assertEqual(first, ("stocks", "SPY", 1, price))
+		self.assertIsInstance(second, trading.OrderRejected)
+		self.assertEqual(ledger.data["1"]["stocks"], {"SPY": {"quantity": 1, "costBasis": price}})
+		self.assertEqual(ledger.data["1"]["currency"], round(price * 0.5, 2))
+
+	def testCoalescing(self):
+		self.setUp()
+		async def fetch():
+			url = ou.quoteURL + "SPY"
+			tasks = [asyncio.ensure_future(ou.httpClient.fetchText(url)) for i in range(10)]
+			await asyncio.sleep(0.02)
+			tasks[0].cancel() # The others still get the (shared) response
+			return await asyncio.gather(*tasks, return_exceptions=True)
+		results = self.withMock(fetch, latency=0.1)
+		self.assertEqual(self.mock.requests, 1)
+		self.assertIsInstance(results[0], asyncio.CancelledError)
+		self.assertEqual(len(set(results[1:])), 1)
+		self.assertEqual(json.loads(results[1])["quoteResponse"]["result"][0]["symbol"], "SPY")
+
+	def testRateLimit(self):
+		self.setUp()
+		with self.assertRaises(ValueError):
+			self.withMock(lambda: ou.getQuotes(["SPY"]), rateLimitRate=1)
+
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+# Position bookkeeping for the economy (buying, selling and migrating holdings)
+from Formatting import messageParser as mp
+from Utils import optionsUtil as ou
+from collections import defaultdict
+import asyncio
+
+
+'''
+##############
+## OVERVIEW ##
+##############
+
+A user's stocks and options are position maps - {symbol: {'quantity', 'costBasis'}}
+
+mergePositions(list positions)
+	Merges an old-style list of [symbol, n] purchases into a position map
+
+migrate(Ledger ledger)
+	Converts everyone's old-style holdings into position maps
+
+validPurchase(float currentLiquid, float cost)
+	Checks if this is a valid purchase
+
+quoteOrder(list contractArgs, int numberOfContracts)
+	Prices an order (coroutine)
+
+placeOrder(Ledger ledger, String ID, list contractArgs, int numberOfContracts, function fill)
+	Quotes and fills an order for the user, one order per user at a time (coroutine)
+
+buySymbol(dict data, tuple order)
+	Fills a (quoted) buy order - the debit and the new position are applied together
+
+sellSymbol(dict data, tuple order)
+	Fills a (quoted) sell order - the credit and the smaller position are applied together
+
+'''
+
+
+
+# One lock per user, so their orders happen one at a time
+userLocks = defaultdict(asyncio.Lock)
+
+
+
+# Raised when an order can't be filled (not enough money, or not enough of the symbol to sell)
+class OrderRejected(ValueError):
+	# (String message, tuple order)
+	def __init__(self, message, order):
+		super().__init__(message)
+		self.order = order
+
+
+
+# mergePositions(list positions)
+# Merges an old-style list of [symbol, n] purchases into a position map ({symbol: {'quantity', 'costBasis'}})
+# (The old lists never recorded what was paid, so the cost basis of merged purchases is 0)
+def mergePositions(positions):
+	merged = {}
+	for symbol, n in positions:
+		position = merged.setdefault(symbol.upper(), {'quantity': 0, 'costBasis': 0})
+		position['quantity'] += n
+	return merged
+
+
+
+# migrate(Ledger ledger)
+# Converts everyone's old-style stocks and options lists into position maps (marking them as changed)
+def migrate(ledger):
+	for ID in ledger.data:
+		if ID != 'name':
+			for group in ['stocks', 'symbols']:
+				if isinstance(ledger.data[ID][group], list):
+					ledger.data[ID][group] = mergePositions(ledger.data[ID][group])
+					ledger.markDirty(ID)
+
+
+
+# validPurchase(float currentLiquid, float cost)
+# Checks if this is a valid purchase
+def validPurchase(currentLiquid, cost):
+	return currentLiquid >= cost
+
+
+
+# quoteOrder(list contractArgs, int numberOfContracts)
+# Prices an order, returning the portfolio it goes in ('stocks' or 'symbols'), the symbol, the amount and the total cost
+async def quoteOrder(contractArgs, numberOfContracts):
+	if numberOfContracts <= 0:
+		raise ValueError("Input improperly formatted")
+
+	if len(contractArgs) == 1: # this is a stock
+		group, symbol, multiplier = 'stocks', contractArgs[0].upper(), 1
+	elif len(contractArgs) == 3: # this is an option (each contract is for 100 shares)
+		t, d, o, s, symbol = mp.parseContractInfo(' '.join(contractArgs))
+		group, multiplier = 'symbols', 100
+	else:
+		raise ValueError("Please check formatting (`!help`)")
+
+	# Priced from the same quotes the portfolio is valued with
+	info = await ou.getStockInfo(symbol)
+	cost = round(info['regularMarketPrice'] * multiplier * numberOfContracts, 2)
+	return group, info['symbol'], numberOfContracts, cost
+
+
+
+# placeOrder(Ledger ledger, String ID, list contractArgs, int numberOfContracts, function fill)
+# Quotes the order and fills it (with buySymbol or sellSymbol) on the user's data, marking them as changed
+# Holding the user's lock from the quote to the fill means two orders can't both spend the same money
+# Returns the order. Raises OrderRejected if it couldn't be filled (or a ValueError if it couldn't be quoted)
+async def placeOrder(ledger, ID, contractArgs, numberOfContracts, fill):
+	async with userLocks[ID]:
+		order = await quoteOrder(contractArgs, numberOfContracts)
+		fill(ledger.data[ID], order)
+		ledger.markDirty(ID)
+	return order
+
+
+
+# buySymbol(dict data, tuple order)
+# Fills the given (quoted) order - the debit and the new position are applied together
+# Raises OrderRejected (leaving the data untouched) if there isn't enough money
+def buySymbol(data, order):
+	group, symbol, numberOfContracts, cost = order
+	if not validPurchase(data['currency'], cost):
+		raise OrderRejected("Insufficient funds", order)
+
+	position = data[group].setdefault(symbol, {'quantity': 0, 'costBasis': 0})
+	position['quantity'] += numberOfContracts
+	position['costBasis'] = round(position['costBasis'] + cost, 2)
+	data['currency'] = round(data['currency'] - cost, 2)
+	return data
+
+
+
+# sellSymbol(dict data, tuple order)
+# Fills the given (quoted) sell order - the credit and the smaller position are applied together
+# Raises OrderRejected (leaving the data untouched) if not enough of the symbol is held
+def sellSymbol(data, order):
+	group, symbol, numberOfContracts, proceeds = order
+	position = data[group].get(symbol)
+	if position is None or position['quantity'] < numberOfContracts:
+		raise OrderRejected("Not enough shares/contracts", order)
+
+	# The cost basis goes down in proportion to what's sold
+	soldBasis = position['costBasis'] * numberOfContracts / position['quantity']
+	position['quantity'] -= numberOfContracts
+	position['costBasis'] = round(position['costBasis'] - soldBasis, 2)
+	if position['quantity'] == 0:
+		del data[group][symbol]
+
+	data['currency'] = round(data['currency'] + proceeds, 2)
+	return data
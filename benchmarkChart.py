@@ -0,0 +1,217 @@
+import generateChart as gc
+import json
+import numpy as np
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+'''
+Replays the v8 chart fixtures (see Fixtures/) through each stage of drawing a chart, in this process (like a worker)
+
+Every stage of a warm chart is timed (best of REPEAT runs), along with the first (cold) chart for each layout and
+the peak (Python-side) memory of a whole chart
+The results are compared against Fixtures/baseline.json, and anything REGRESSION slower than it is flagged
+The baseline is scaled by how fast a fixed reference workload ran (so a slower/busier machine isn't a regression), and
+a stage is only flagged if it slowed down by more than its own run-to-run spread, and again when the fixture is rerun
+
+python benchmarkChart.py          compare against the baseline
+python benchmarkChart.py --save   record a new baseline
+'''
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Fixtures")
+BASELINE = os.path.join(FIXTURES, "baseline.json")
+
+# fixture -> the chart length (in days) it's drawn at
+LENGTHS = {"1d_2m": 1, "5d_5m": 5, "3m_60m": 90, "3y_1d": 3 * 365}
+
+REPEAT = 20
+# How much slower (as a fraction) than the baseline a stage can get before it's flagged
+REGRESSION = 0.25
+# Differences smaller than this (in ms or KB) are just noise, and are never flagged
+NOISE = 1.0
+# How many more times a fixture is run to confirm a regression
+CONFIRM = 2
+
+STAGES = ["getData", "extrapolateData", "downsample", "template", "drawChart", "png", "total", "reference"]
+# Reported, but never flagged - a single cold sample (which depends on what ran before it), and the reference workload
+UNGATED = ["firstChart", "reference"]
+
+
+
+# loadFixture(String name)
+# Loads the recorded response for the fixture
+def loadFixture(name):
+	with open(os.path.join(FIXTURES, name + ".json")) as f:
+		return json.load(f)
+
+
+
+# timeStages(int length, dict data)
+# Draws the chart one stage at a time (calling the same stage methods as Chart), timing each stage
+# Returns a dict of stage -> seconds
+def timeStages(length, data):
+	chart = gc.Chart.__new__(gc.Chart)
+	times = {}
+
+	start = time.perf_counter()
+	dates, price, volume = chart.getData(data)
+	times["getData"] = time.perf_counter() - start
+
+	# Already part of getData - timed on its own since it's the only per-point Python-side work
+	result = data['chart']['result'][0]
+	prevClose = result['meta'].get('previousClose', result['meta'].get('chartPreviousClose')) # Like getData
+	start = time.perf_counter()
+	chart.extrapolateData(result['indicators']['quote'][0]['close'], prevClose)
+	times["extrapolateData"] = time.perf_counter() - start
+
+	start = time.perf_counter()
+	series = chart.downsample(dates, price, volume)
+	times["downsample"] = time.perf_counter() - start
+
+	# The templates are built ahead of time (see benchmark), so this is just the lookup, like in a warm worker
+	start = time.perf_counter()
+	template = gc.getTemplate(chart.tickLayout(length))
+	times["template"] = time.perf_counter() - start
+
+	try:
+		start = time.perf_counter()
+		fig = chart.drawChart(template, "BENCHMARK", *series)
+		times["drawChart"] = time.perf_counter() - start
+
+		start = time.perf_counter()
+		chart.encode(fig)
+		times["png"] = time.perf_counter() - start
+	finally:
+		template.reset()
+
+	times["total"] = sum(times[stage] for stage in STAGES if stage not in ["extrapolateData", "total", "reference"])
+	return times
+
+
+
+# peakMemory(int length, dict data)
+# Returns the peak memory (in bytes) allocated while drawing a whole chart
+# Only Python-side allocations (including NumPy's) are tracked - not Agg's own buffers
+def peakMemory(length, data):
+	tracemalloc.start()
+	try:
+		gc.Chart("BENCHMARK", "BENCHMARK", length, data)
+		return tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+
+
+# timeReference()
+# Times a fixed workload (a big NumPy call, and lots of small ones like downsampling makes), returning the seconds it took
+# How long it takes compared to the baseline's is how much faster/slower this machine is running right now
+def timeReference():
+	values = np.random.default_rng(0).random(200000)
+	start = time.perf_counter()
+	np.sort(values)
+	for i in range(0, len(values), 200):
+		np.argmax(np.abs(values[i:i + 200] - values[i:i + 200].mean()))
+	return time.perf_counter() - start
+
+
+
+# benchmark(list[String] names)
+# Runs the fixtures, returning fixture -> stage -> milliseconds (and the peak memory in KB), along with
+# fixture -> stage -> the spread (median - best, in milliseconds) of its runs
+def benchmark(names):
+	results = {}
+	spreads = {}
+	for name in names:
+		length, data = LENGTHS[name], loadFixture(name)
+		# The first chart for a layout also builds its template (and the very first pays for loading matplotlib)
+		start = time.perf_counter()
+		gc.Chart("BENCHMARK", "BENCHMARK", length, data)
+		first = time.perf_counter() - start
+
+		# The reference workload is timed between the runs, so it sees the same load they do
+		runs = []
+		for i in range(REPEAT):
+			runs.append(timeStages(length, data))
+			runs[-1]["reference"] = timeReference()
+		results[name] = {stage: round(min(run[stage] for run in runs) * 1e3, 3) for stage in STAGES}
+		spreads[name] = {stage: statistics.median(run[stage] for run in runs) * 1e3 - results[name][stage]
+			for stage in STAGES}
+		results[name]["firstChart"] = round(first * 1e3, 3)
+		results[name]["peakKB"] = round(peakMemory(length, data) / 1024, 1)
+	return results, spreads
+
+
+
+# compare(String name, String stage, dict results, dict baseline)
+# Returns the baseline's value for the stage (scaled to this machine's current speed), or None if there isn't one
+def compare(name, stage, results, baseline):
+	old = baseline.get(name, {}).get(stage)
+	reference = baseline.get(name, {}).get("reference")
+	# Memory doesn't depend on how busy the machine is
+	if old and reference and stage != "peakKB":
+		old *= results[name]["reference"] / reference
+	return old
+
+
+
+# regressions(dict results, dict spreads, dict baseline)
+# Returns the set of (fixture, stage) that got more than REGRESSION slower than the baseline (and by more than the
+# noise - NOISE, or the stage's own spread if that's bigger)
+def regressions(results, spreads, baseline):
+	regressed = set()
+	for name, stages in results.items():
+		for stage, value in stages.items():
+			old = compare(name, stage, results, baseline)
+			noise = max(NOISE, spreads[name].get(stage, 0))
+			if old and stage not in UNGATED and (value - old) / old > REGRESSION and value - old > noise:
+				regressed.add((name, stage))
+	return regressed
+
+
+
+# report(dict results, dict baseline, set regressed)
+# Prints the results, next to the baseline (if there is one), marking the regressed stages
+def report(results, baseline, regressed):
+	for name, stages in results.items():
+		print(name)
+		for stage, value in stages.items():
+			unit = "KB" if stage == "peakKB" else "ms"
+			line = "  {0:<16} {1:10.3f} {2}".format(stage, value, unit)
+
+			old = compare(name, stage, results, baseline)
+			if old:
+				line += "  ({0:+.0%} vs {1:.3f})".format((value - old) / old, old)
+				if (name, stage) in regressed:
+					line += "  <- REGRESSION"
+			print(line)
+
+
+
+if __name__ == "__main__":
+	results, spreads = benchmark(LENGTHS)
+
+	if "--save" in sys.argv:
+		with open(BASELINE, "w") as f:
+			json.dump(results, f, indent=4)
+		report(results, {}, set())
+		print("Saved the baseline to", BASELINE)
+	else:
+		baseline = {}
+		if os.path.isfile(BASELINE):
+			with open(BASELINE) as f:
+				baseline = json.load(f)
+
+		# A slow stretch on a busy machine can outlast a fixture's runs, so a regression only counts if it's still
+		# there when the fixture is run again
+		regressed = regressions(results, spreads, baseline)
+		for attempt in range(CONFIRM):
+			if not regressed:
+				break
+			retry, retrySpreads = benchmark(sorted({name for name, stage in regressed}))
+			results.update(retry)
+			regressed &= regressions(retry, retrySpreads, baseline)
+
+		report(results, baseline, regressed)
+		sys.exit(1 if regressed else 0)
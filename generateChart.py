@@ -1,9 +1,22 @@
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from collections import OrderedDict
+import matplotlib
+from dateutil import tz
 import matplotlib.dates as md
 import matplotlib.ticker as mtick
 import numpy as np
+import asyncio
+import io
+import multiprocessing
+import os
+import time
 from Utils import optionsUtil as ou
+from Utils import quoteCache
+from Utils.barStore import BarStore
 
 
 '''
@@ -11,48 +24,356 @@ from Utils import optionsUtil as ou
 ## OVERVIEW ##
 ##############
 
-getData(String symbol, int length, int interval)
-	Takes the ticker/contract symbol and the duration of the chart
+fetchData(String symbol, int length, String interval)
+	Fetches the raw chart data for the ticker/contract symbol and the duration of the chart (coroutine)
 
-extrapolateData(list[X] data, X prev, boolean append)
+chartURL(String symbol, int period1, int period2, String interval)
+	Returns the URL of the v8 chart data for the symbol between the two timestamps
+
+getData(dict data)
+	Parses the raw chart data into the time, price, and volume series
+
+extrapolateData(list[float] data, float prev)
 	Fills any blank spots in the data by extrapolating 
 
-drawGraph(list[int] x, list[float] y, list[int] vol, String title, int length)
-	Takes lists of x, y, and volume data, and draws a graph
+drawGraph(ChartTemplate template, array[datetime64] dates, array[float] y)
+	Takes arrays of dates and prices, and draws a graph
+
+Chart(String string, String symbol, int length, dict data, String saveTo)
+	Draws the chart in stages (getData, downsample, getTemplate, drawChart, encode) - benchmarkChart.py times each one
+
+ChartTemplate(tuple layout)
+	A reusable figure (with both axes and the tick formatting set up) for one tick layout
+
+getTemplate(tuple layout)
+	Returns this process's template for the layout, creating it if needed
+
+intervalSeconds(String interval)
+	Converts a Yahoo interval (eg. 2m, 1d) into seconds
+
+lttb(array x, array y, int threshold)
+	Picks the threshold points that best keep the shape of the line (Largest-Triangle-Three-Buckets)
+
+minMax(array y, int buckets)
+	Picks the lowest and highest point in each of the buckets
+
+generateChart(String string, String symbol, int length, String interval)
+	Fetches the data and draws the chart in the worker pool (coroutine)
+
+runInPool(String string, String symbol, int length, dict data)
+	Draws the chart in the worker pool, replacing the pool if a worker has died (coroutine)
 
-generateChart(String string, String symbol, int length)
-	Takes the given string, the contract symbol, and the length of data to be viewed)
+renderChart(String string, String symbol, int length, dict data)
+	Draws the chart as PNG bytes (runs in a worker process)
+
+warmUp()
+	Loads the backend and fonts, and builds the most common templates (runs when a worker process starts)
+
+poolContext()
+	Returns the multiprocessing context the workers are started with (a fork server, rather than forking the bot)
+
+startPool()
+	Starts the worker pool (and warms every worker up) ahead of the first chart
+
+shutdown()
+	Shuts down the worker pool
 
 '''
 
-class Chart:
-	# The base URL for fetching the chart data. (Replace here if/when yahoo gets tired of people mooching off their API
-	baseURL = "https://query1.finance.yahoo.com/v8/finance/chart/"
 
-	# (String symbol, int length, int interval)
-	# Takes the ticker/contract symbol and the duration of the chart
-	def getData(self, symbol, length, interval):
-		# Gets the start and end dates of the chart based on the arg length
-		endDate = datetime.now()
-		startDate = endDate - timedelta(days=length)
+# Charts are drawn in a pool of CHART_WORKERS processes, with at most CHART_QUEUE_DEPTH charts waiting/in progress
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", 2))
+CHART_QUEUE_DEPTH = int(os.getenv("CHART_QUEUE_DEPTH", 8))
+# Charts are kept in memory, unless CHART_DIR is set (then a copy is also saved there)
+CHART_DIR = os.getenv("CHART_DIR")
+
+# The dates are plotted in UTC, so the axes are labelled in local time
+LOCAL_TZ = tz.tzlocal()
+
+# Series are downsampled to about one point per pixel column before they're drawn
+PIXEL_WIDTH = int(matplotlib.rcParams["figure.figsize"][0] * matplotlib.rcParams["figure.dpi"])
+
+# Finished charts are reused until the current interval (capped at MAX_BUCKET seconds) is over
+MAX_BUCKET = 60 * 60
+cache = quoteCache.TTLCache(int(os.getenv("CHART_CACHE_BYTES", 32 * 1024 * 1024)))
+
+# The bars behind the charts are kept in BAR_STORE, so only the newest bars have to be fetched
+BAR_STORE = os.getenv("BAR_STORE", "bars.db")
+
+# Each process keeps a figure per tick layout (up to TEMPLATE_LIMIT, least recently used are dropped first)
+TEMPLATE_LIMIT = 8
+# The chart lengths (in days) whose templates are built when a worker starts
+WARM_LENGTHS = [1, 5]
+
+_pool = None
+_bars = None
+_templates = OrderedDict()
+_pending = 0
+
+
+
+# Raised when there are already too many charts waiting to be drawn
+class ChartQueueFull(ValueError):
+	pass
+
+
+
+# fetchData(String symbol, int length, String interval)
+# Fetches the raw chart data for the ticker/contract symbol and the duration of the chart
+# Only the bars that aren't in the bar store are downloaded - the rest is read from disk
+async def fetchData(symbol, length, interval):
+	global _bars
+	if _bars is None:
+		_bars = BarStore(BAR_STORE)
+
+	# Gets the start and end dates of the chart based on the arg length
+	endDate = datetime.now()
+	startDate = endDate - timedelta(days=length)
+
+	# Calculates the unix timestamps for the start/end dates
+	period1, period2 = [int(x.timestamp()) for x in [startDate, endDate]]
+
+	# The database is only touched from worker threads, so the event loop isn't held up by the disk
+	loop = asyncio.get_running_loop()
+	freshFor = min(intervalSeconds(interval), MAX_BUCKET)
+	ranges = await loop.run_in_executor(None, _bars.missing, symbol, interval, period1, period2, freshFor)
+
+	responses = await asyncio.gather(*[ou.loadFrom(chartURL(symbol, start, end, interval)) for start, end in ranges])
+	for (start, end), data in zip(ranges, responses):
+		await loop.run_in_executor(None, _bars.add, symbol, interval, start, end, data)
+
+	return await loop.run_in_executor(None, _bars.read, symbol, interval, period1, period2)
+
+
+
+
+
+# chartURL(String symbol, int period1, int period2, String interval)
+# Returns the URL of the v8 chart data for the symbol between the two timestamps
+def chartURL(symbol, period1, period2, interval):
+	# All the URL arguments
+	# "interval" MUST be 2m. No clue why, but Yahoo throws a hissy fit if we try using other intervals, 
+	# even though it lists [1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h, 1d, 5d, 1wk, 1mo, 3mo] as valid intervals
+	urlArgs = {"period1": str(period1), "period2": str(period2), "interval": interval, "includePrePost": "true"}
+
+	urlArgsString = ""
+	for key in urlArgs.keys():
+		urlArgsString = "{0}{1}={2}&".format(urlArgsString, key, urlArgs[key])
+
+	# Oh yeah, it's all coming together
+	return "{0}{1}?{2}".format(Chart.baseURL, symbol, urlArgsString)
+
+
+
+
+
+# intervalSeconds(String interval)
+# Converts a Yahoo interval (eg. 2m, 1d) into seconds
+def intervalSeconds(interval):
+	multiplier = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "wk": 7 * 24 * 60 * 60, "mo": 30 * 24 * 60 * 60}
+	number = int("".join(c for c in interval if c.isdigit()))
+	return number * multiplier[interval.lstrip("0123456789")]
+
+
+
+
+
+# lttb(array x, array y, int threshold)
+# Picks the threshold points that best keep the shape of the line (Largest-Triangle-Three-Buckets)
+# The first and last points are always kept. Returns the indices of the picked points
+def lttb(x, y, threshold):
+	n = len(y)
+	if threshold >= n or threshold < 3:
+		return np.arange(n)
+
+	x = np.asarray(x, dtype=float)
+	y = np.asarray(y, dtype=float)
+	# Everything between the first and last point is split into threshold - 2 buckets
+	edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+
+	index = np.empty(threshold, dtype=np.int64)
+	index[0], index[-1] = 0, n - 1
+	a = 0
+	for i in range(threshold - 2):
+		start, end = edges[i], edges[i + 1]
+		# The point picked from each bucket makes the largest triangle with the last pick and the next bucket's average
+		if i + 2 < len(edges):
+			nextX, nextY = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+		else:
+			nextX, nextY = x[-1], y[-1]
+
+		area = np.abs((x[a] - nextX) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (nextY - y[a]))
+		a = start + int(np.argmax(area))
+		index[i + 1] = a
+	return index
+
+
+
+
+
+# minMax(array y, int buckets)
+# Picks the lowest and highest point in each of the buckets (so spikes survive, unlike with averaging)
+# The first and last points are always kept. Returns the (sorted) indices of the picked points
+def minMax(y, buckets):
+	n = len(y)
+	if 2 * buckets >= n or buckets < 1:
+		return np.arange(n)
+
+	y = np.asarray(y, dtype=float)
+	edges = np.linspace(0, n, buckets + 1).astype(int)
+	index = [0, n - 1]
+	for start, end in zip(edges[:-1], edges[1:]):
+		index.append(start + int(np.argmin(y[start:end])))
+		index.append(start + int(np.argmax(y[start:end])))
+	return np.unique(index)
+
+
+
+
+
+# generateChart(String string, String symbol, int length, String interval)
+# Fetches the data and draws the chart in the worker pool
+# Returns the chart as PNG bytes, or raises ChartQueueFull if the queue is full
+async def generateChart(string, symbol, length, interval="2m"):
+	global _pending
+
+	# Charts drawn during the same interval would be identical, so they're cached by the interval they fall in
+	bucketSize = min(intervalSeconds(interval), MAX_BUCKET)
+	bucket = int(time.time() // bucketSize)
+	key = (string.upper(), symbol, length, interval, bucket)
+	png = cache.get(key)
+	if png is not None:
+		return png
+
+	if _pending >= CHART_QUEUE_DEPTH:
+		raise ChartQueueFull("Too many charts in the queue")
+
+	_pending += 1
+	try:
+		data = await fetchData(symbol, length, interval)
+
+		try:
+			png = await runInPool(string, symbol, length, data)
+		except BrokenProcessPool:
+			# A worker died (eg. it was killed for using too much memory), which breaks the pool for good
+			png = await runInPool(string, symbol, length, data)
+	finally:
+		_pending -= 1
+
+	# Expires when the bucket does
+	cache.set(key, png, (bucket + 1) * bucketSize - time.time(), len(png))
+	return png
+
+
 
-		# Calculates the unix timestamps for the start/end dates
-		period1, period2 = [int(x.timestamp()) for x in [startDate, endDate]]
-		
-		# All the URL arguments
-		# "interval" MUST be 2m. No clue why, but Yahoo throws a hissy fit if we try using other intervals, 
-		# even though it lists [1m, 2m, 5m, 15m, 30m, 60m, 90m, 1h, 1d, 5d, 1wk, 1mo, 3mo] as valid intervals
-		urlArgs = {"period1": str(period1), "period2": str(period2), "interval": interval, "includePrePost": "true"}
 
-		urlArgsString = ""
-		for key in urlArgs.keys():
-			urlArgsString = "{0}{1}={2}&".format(urlArgsString, key, urlArgs[key])
 
-		# Oh yeah, it's all coming together (put the URL together and fetch data)
-		data = ou.loadFrom("{0}{1}?{2}".format(self.baseURL, symbol, urlArgsString))
+# runInPool(String string, String symbol, int length, dict data)
+# Draws the chart in the worker pool
+# If the pool is broken, it's shut down (so the next chart starts a new one) before the error is raised
+async def runInPool(string, symbol, length, data):
+	startPool()
+	pool = _pool
+	try:
+		return await asyncio.get_running_loop().run_in_executor(pool, renderChart, string, symbol, length, data)
+	except BrokenProcessPool:
+		if _pool is pool: # Another chart may have already replaced it
+			shutdown()
+		raise
 
+
+
+
+
+# renderChart(String string, String symbol, int length, dict data)
+# Draws the chart as PNG bytes (runs in a worker process)
+def renderChart(string, symbol, length, data):
+	return Chart(string, symbol, length, data, saveTo=CHART_DIR).png
+
+
+
+
+
+# getTemplate(tuple layout)
+# Returns this process's template for the layout, creating it if needed
+def getTemplate(layout):
+	template = _templates.get(layout)
+	if template is None:
+		template = _templates[layout] = ChartTemplate(layout)
+		if len(_templates) > TEMPLATE_LIMIT:
+			_templates.popitem(last=False)
+	_templates.move_to_end(layout)
+	return template
+
+
+
+
+
+# warmUp()
+# Loads the backend and fonts, and builds the most common templates (runs when a worker process starts)
+# Drawing a throwaway chart for each pays for the font cache, glyph loading and the first draw up front
+def warmUp():
+	matplotlib.use("Agg")
+	timestamps = [0, 60 * 60, 2 * 60 * 60]
+	data = {"chart": {"result": [{"timestamp": timestamps, "meta": {"previousClose": 1},
+		"indicators": {"quote": [{"close": [1, 2, 1], "volume": [1, 2, 1]}]}}]}}
+	for length in WARM_LENGTHS:
+		Chart("$WARM", "WARM", length, data)
+
+
+
+
+
+# poolContext()
+# Returns the multiprocessing context the workers are started with
+# Forking the bot itself would copy its running threads (eg. the gateway heartbeat), so the workers are forked from a
+# server with just this module loaded instead (or spawned, where there's no fork server)
+def poolContext():
+	if "forkserver" not in multiprocessing.get_all_start_methods():
+		return multiprocessing.get_context("spawn")
+	context = multiprocessing.get_context("forkserver")
+	context.set_forkserver_preload([__name__])
+	return context
+
+
+
+
+
+# startPool()
+# Starts the worker pool (and warms every worker up) ahead of the first chart
+def startPool():
+	global _pool
+	if _pool is None:
+		_pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=poolContext(), initializer=warmUp)
+		# Workers are only started as tasks come in, so one is sent to each
+		for i in range(CHART_WORKERS):
+			_pool.submit(os.getpid)
+
+
+
+
+
+# shutdown()
+# Shuts down the worker pool
+def shutdown():
+	global _pool
+	if _pool is not None:
+		_pool.shutdown(wait=False, cancel_futures=True)
+		_pool = None
+
+
+
+
+
+class Chart:
+	# The base URL for fetching the chart data. (Replace here if/when yahoo gets tired of people mooching off their API
+	baseURL = ou.YAHOO_URL + "/v8/finance/chart/"
+
+	# (dict data)
+	# Parses the raw chart data into the time, price, and volume series
+	def getData(self, data):
 		try: # Using time as the bellwether here - everything else, we can extrapolate
-			time = data['chart']['result'][0]['timestamp']
+			timestamps = data['chart']['result'][0]['timestamp']
 		except:
 			raise ValueError("Not enough data for a graph")
 
@@ -62,33 +383,38 @@ class Chart:
 			prevClose = data['chart']['result'][0]['meta']['previousClose']
 		except: 
 			prevClose = data['chart']['result'][0]['meta']['chartPreviousClose']
+
+		# Converts the timestamps once (matplotlib plots datetime64 directly, in UTC - see LOCAL_TZ)
+		dates = np.asarray(timestamps, dtype="int64").astype("datetime64[s]")
 		
 		# Extrapolates data to fit every point (Yahoo has some [many] blind spots for some [most] contracts)
 		price = self.extrapolateData(price, prevClose)
-		volume = [0 if x == None else x for x in volume]
+		volume = np.nan_to_num(np.array(volume, dtype=float)) # None -> NaN -> 0
 
 
-		# returns a list[int], list[float], list[int]
-		return time, price, volume
+		# returns an array[datetime64], array[float], array[float]
+		return dates, price, volume
 
 
-	# (list[X] data, X prev)
-	# Fills any blank spots in the data by extrapolating 
+	# (list[float] data, float prev)
+	# Fills any blank spots in the data by carrying the last value forward (prev fills any leading blanks)
 	def extrapolateData(self, data, prev):
-		new = []
-		for d in data:
-			if d == None:
-				new.append(prev)
-			else:
-				new.append(d)
-				prev = d
-		return new
+		data = np.array(data, dtype=float) # None -> NaN
+		# The index of the last real value at (or before) each point
+		index = np.where(np.isnan(data), 0, np.arange(len(data)))
+		np.maximum.accumulate(index, out=index)
+
+		filled = data[index]
+		filled[np.isnan(filled)] = prev
+		return filled
 
 
 
-	# tickFormatter(int length)
+	# tickLayout(int length)
 	# Given the chart duration, determine x-Axis formatting
-	def tickFormatter(self, length, ax2):
+	# Returns the (major format, major interval, minor format, minor interval) - the intervals are in hours
+	@staticmethod
+	def tickLayout(length):
 		# Sets the tick formatting for the x-axis
 		times = {1: ["%H:%M", 1, "%H:%M", 8], 2: ["%m/%d", 24, "%H:%M", 4], 
 		5: ["%m/%d", 24, "%H:%M", 12], 10: ["%m/%d", 24, "%H:%M", 48]}
@@ -99,88 +425,147 @@ class Chart:
 				length = 5
 			elif length > 2 and length < 5:
 				length = 2
-			majF, majL, minF, minL = times[length][0], times[length][1], times[length][2], times[length][3]
+			return tuple(times[length])
 
 		# long-term cases
-		elif length > 10:
-			majF, majL, minF, minL = times[10][0], 24 * int(length/10), times[10][2], 48 * int(length/10)
-
-		# Sets the x-axis date formats
-		ax2.xaxis.set_major_formatter(md.DateFormatter(majF))
-		ax2.xaxis.set_major_locator(md.HourLocator(interval=majL))
-		ax2.xaxis.set_minor_formatter(md.DateFormatter(minF))
-		ax2.xaxis.set_minor_locator(md.HourLocator(interval=minL))
+		return times[10][0], 24 * int(length/10), times[10][2], 48 * int(length/10)
+
+
+
+	# tickFormatter(tuple layout, ax2)
+	# Sets the x-axis date formats (see tickLayout)
+	@staticmethod
+	def tickFormatter(layout, ax2):
+		majF, majL, minF, minL = layout
+		ax2.xaxis.set_major_formatter(md.DateFormatter(majF, tz=LOCAL_TZ))
+		ax2.xaxis.set_major_locator(md.HourLocator(interval=majL, tz=LOCAL_TZ))
+		ax2.xaxis.set_minor_formatter(md.DateFormatter(minF, tz=LOCAL_TZ))
+		ax2.xaxis.set_minor_locator(md.HourLocator(interval=minL, tz=LOCAL_TZ))
 		return ax2
 
 
 
 
 
-	# generateAxes(x, y, dates)
-	# generates the axes and figure from the x, y, and dates
-	def generateAxes(self, x, y):
+	# generateAxes(ChartTemplate template, dates, y)
+	# Fits the template's axes to the dates and prices
+	def generateAxes(self, template, dates, y):
 		# Calculates the min and max of the y-axis (for price)
 		# We don't want the max to be 0, so we take the max of (2 and the real max)
 		yMax = int(max(2, np.max(y)))
 		yMin = int(np.min(y))
 		yRange = int((yMax - yMin) / 2)
 
-		dates = [datetime.fromtimestamp(date) for date in x]
-
-		# Init
-		fig, ax1 = plt.subplots()
-
 		# Sets the max and min for the x-axis
-		ax1.set_xlim(xmin = np.min(dates), xmax = np.max(dates))
+		template.ax1.set_xlim(xmin = dates[0], xmax = dates[-1])
 		# Sets min/max for pricing. Min can never go below 0.
-		ax1.set_ylim(ymin = max(0, yMin - yRange), ymax = yMax + yRange)
-
-		# Sets the tick formatting for the prices y-axis
-		ax1.yaxis.set_major_formatter(mtick.StrMethodFormatter('${x:,.0f}'))
-
-		return fig, ax1
+		template.ax1.set_ylim(ymin = max(0, yMin - yRange), ymax = yMax + yRange)
 
+		return template.fig, template.ax1
 
 
 
-	# (list[int] x, list[float] y, list[int] vol, String title, int length)
-	# Takes lists of x, y and draws a graph
-	def drawGraph(self, x, y):
-		# Converts the timestamps in x into date objects
-		dates = [datetime.fromtimestamp(date) for date in x]
 
+	# (ChartTemplate template, array[datetime64] dates, array[float] y)
+	# Takes arrays of dates and prices, and draws a graph
+	def drawGraph(self, template, dates, y):
 		# Initializes
-		fig, ax1 = self.generateAxes(x, y)
+		fig, ax1 = self.generateAxes(template, dates, y)
 
 		# Plots the prices
-		ax1.plot(dates, y, "#00A95D")
+		template.artists.extend(ax1.plot(dates, y, "#00A95D"))
 		l1 = ax1.fill_between(dates, y, facecolor="#00A95D")
+		template.artists.append(l1)
 
 		return fig, ax1, l1
 
-	# (String string, String symbol, int length)
-	# Takes the given string, the contract symbol, and the length of data to be viewed
-	def __init__(self, string, symbol, length, interval="2m"):
-		time, price, volume = self.getData(symbol, length, interval)
+	# downsample(array[datetime64] dates, array[float] price, array[float] volume)
+	# Cuts the series down to about one point per pixel column (anything past that would be drawn over itself)
+	# Returns the price dates, prices, volume dates and volumes
+	def downsample(self, dates, price, volume):
+		priceIndex = lttb(dates.astype("int64"), price, PIXEL_WIDTH)
+		volumeIndex = minMax(volume, PIXEL_WIDTH // 2)
+		return dates[priceIndex], price[priceIndex], dates[volumeIndex], volume[volumeIndex]
+
+
+
+	# drawChart(ChartTemplate template, String string, priceDates, price, volumeDates, volume)
+	# Draws the price, the volume, the title and the legend onto the template
+	def drawChart(self, template, string, priceDates, price, volumeDates, volume):
 		cleanTitle = string.upper()
 		cleanTitle = cleanTitle.replace("$", "\$")
 
-		fig, ax1, l1 = self.drawGraph(time, price)
+		fig, ax1, l1 = self.drawGraph(template, priceDates, price)
+
+		# axes2 shares the xAxis
+		ax2 = template.ax2
+		ax2.set_ylim(ymin = 0, ymax = max(1, np.max(volume)) * 2) # So volume occupies the bottom half of the graph
 
-		# Initializes axes2 with identical xAxis
-		ax2 = self.tickFormatter(length, ax1.twinx())
-		ax2.set_ylim(ymin = 0, ymax = max(volume) * 2) # So volume occupies the bottom half of the graph
-		
 		# Plots the volume
-		dates = [datetime.fromtimestamp(date) for date in time]
-		ax2.plot(dates, volume, "#B2DCCB")
-		l2 = ax2.fill_between(dates, volume, facecolor="#B2DCCB")
+		template.artists.extend(ax2.plot(volumeDates, volume, "#B2DCCB"))
+		l2 = ax2.fill_between(volumeDates, volume, facecolor="#B2DCCB")
+		template.artists.append(l2)
 
-		
 		# Meta
-		plt.title(cleanTitle)
-		name = "charts/" + symbol + '.png'
-		plt.savefig(name)
-		plt.legend([l1, l2], ["Price", "Volume"]) # Legend for both
+		ax1.set_title(cleanTitle)
+		template.artists.append(ax1.legend([l1, l2], ["Price", "Volume"])) # Legend for both
+		return fig
+
+
+
+	# encode(Figure fig)
+	# Returns the figure as PNG bytes
+	def encode(self, fig):
+		buffer = io.BytesIO()
+		fig.savefig(buffer, format="png")
+		return buffer.getvalue()
+
+
+
+	# (String string, String symbol, int length, dict data, String saveTo)
+	# Takes the given string, the contract symbol, the length of data to be viewed, and the fetched chart data
+	# The chart is rendered to self.png (and also saved to the saveTo directory, if one is given)
+	def __init__(self, string, symbol, length, data, saveTo=None):
+		dates, price, volume = self.getData(data)
+		series = self.downsample(dates, price, volume)
+
+		# The figure, axes and tick formatting are reused - only the data is drawn fresh
+		template = getTemplate(self.tickLayout(length))
+		try:
+			fig = self.drawChart(template, string, *series)
+			self.png = self.encode(fig)
+		finally:
+			template.reset() # Leaves the template blank for the next chart
+
+		self.name = None
+		if saveTo is not None:
+			self.name = os.path.join(saveTo, symbol + '.png')
+			with open(self.name, "wb") as f:
+				f.write(self.png)
+
+
+
+
+
+class ChartTemplate:
+	# (tuple layout)
+	# A blank figure with both axes and the tick formatting for the layout (see Chart.tickLayout) set up
+	def __init__(self, layout):
+		# No pyplot - its global state isn't safe to share between charts
+		self.fig = Figure()
+		FigureCanvasAgg(self.fig) # Attaches the canvas once, rather than on every savefig
+		self.ax1 = self.fig.subplots()
+		# Sets the tick formatting for the prices y-axis
+		self.ax1.yaxis.set_major_formatter(mtick.StrMethodFormatter('${x:,.0f}'))
+		# Initializes axes2 with identical xAxis
+		self.ax2 = Chart.tickFormatter(layout, self.ax1.twinx())
+		self.artists = [] # Everything drawn for the current chart
+
+
 
-		self.name = name
+	# reset()
+	# Removes everything drawn for the current chart
+	def reset(self):
+		for artist in self.artists:
+			artist.remove()
+		self.artists = []
@@ -7,44 +7,73 @@ import asyncio
 from Formatting import messageParser as mp
 import generateChart as gc
 from Utils import optionsUtil as ou
+from Utils import httpClient
+from Utils.ledger import Ledger
+from Utils.marketRefresher import MarketRefresher
+from Utils import trading
 # General
+import io
 import os
 from datetime import datetime
-import json
 
-# Loads the env file (contains the token)
-load_dotenv()
-TOKEN = os.getenv('DISCORD_TOKEN')
-BOT_ADMIN_ID = os.getenv('BOT_ADMIN')
+# Everything that reads the env file (or builds/opens anything) is set up by main, so importing this module is cheap
+# (Under spawn or forkserver, every chart worker runs it again as __mp_main__)
+TOKEN = None
+BOT_ADMIN_ID = None
 
 # For putting someone in timeout
 MOVE_BACK = False
 MEMBER_TO_MOVE = []
-TIMEOUT_CHANNEL = int(os.getenv("TIMEOUT_CHANNEL"))
-CANNOT_BE_TIMEOUTED = [str(BOT_ADMIN_ID), "201503408652419073", "285480424904327179"]
+TIMEOUT_CHANNEL = None
+CANNOT_BE_TIMEOUTED = []
+
+
+
+class OptionsBot(commands.Bot):
+	# Closes the shared HTTP session when the bot shuts down
+	async def close(self):
+		await httpClient.close()
+		gc.shutdown()
+		# Writes anything the flush task hasn't gotten to yet
+		if hasattr(self, 'flushTask'):
+			self.flushTask.cancel()
+			self.refreshTask.cancel()
+		currency.flush()
+		await super().close()
 
 
 
 def initialize():
 	# Initializes with command prefix
-	bot = commands.Bot(command_prefix='!')
+	bot = OptionsBot(command_prefix='!')
 	client = discord.Client()
 	bot.remove_command('help') # Removes the default help command
 
+	# The commands and events below are defined without a bot (so importing this module doesn't build one)
+	for command in [value for value in globals().values() if isinstance(value, commands.Command)]:
+		bot.add_command(command)
+	bot.event(on_ready)
+	bot.event(on_voice_state_update)
+
 	return bot, client
 
-# Initialize the bot
-bot, client = initialize()
+# (Built by main)
+bot, client = None, None
 
 
 
 
 
 # Changes the bot presence state
-@bot.event
 async def on_ready():
 	await bot.change_presence(activity=discord.Game(name='!help'))
 
+	# on_ready can fire again after a reconnect, so the background tasks are only started once
+	if not hasattr(bot, 'flushTask'):
+		bot.flushTask = bot.loop.create_task(currency.flushLoop())
+		bot.refreshTask = bot.loop.create_task(refresher.run())
+		gc.startPool() # So the first chart doesn't wait on the workers starting up
+
 
 
 
@@ -62,7 +91,7 @@ def is_approved(ctx):
 
 
 # If someone's acting up, removes them from this voice channel and moves them everytime they join back
-@bot.command(name='timeout')
+@commands.command(name='timeout')
 async def timeout(ctx, member:discord.Member=None):
 	guild = ctx.message.guild
 	global TIMEOUT_CHANNEL, MOVE_BACK, MEMBER_TO_MOVE
@@ -97,7 +126,6 @@ async def newVoiceChannel(guild, name):
 
 
 ## If they try leaving, move them back
-@bot.event
 async def on_voice_state_update(member, before, after):
 
 	global TIMEOUT_CHANNEL
@@ -122,7 +150,7 @@ async def on_voice_state_update(member, before, after):
 
 
 ## Ends the timeout
-@bot.command(name='endtimeout')
+@commands.command(name='endtimeout')
 async def endtimeout(ctx, member:discord.Member=None):
 	global MOVE_BACK
 	global MEMBER_TO_MOVE
@@ -138,7 +166,7 @@ async def endtimeout(ctx, member:discord.Member=None):
 
 
 # New help command
-@bot.command(name='help')
+@commands.command(name='help')
 async def help(ctx):
 	embed = discord.Embed(title="OptionsBot Help", description="Commands and descriptions", color=0x0000ff)
 
@@ -157,7 +185,8 @@ async def help(ctx):
 		"the price and volume of a STOCK\n\n")
 
 	trading = ("`!buy (<TICKER> OR <TICKER> <DATE><TYPE> <STRIKE>) <N>` : Buys *N* contracts/shares of the given option "
-		"or stock\n\n`!portfolio` :  Returns the value of your portfolio (broken down into categories)\n\n"
+		"or stock\n\n`!sell (<TICKER> OR <TICKER> <DATE><TYPE> <STRIKE>) <N>` : Sells *N* contracts/shares of the given "
+		"option or stock\n\n`!portfolio` :  Returns the value of your portfolio (broken down into categories)\n\n"
 		"`!leaderboard` : Returns everyone's standings on the leaderboard")
 
 	embed.add_field(name="Misc", value=misc, inline=False)
@@ -170,7 +199,7 @@ async def help(ctx):
 
 
 # ping
-@bot.command(name='ping')
+@commands.command(name='ping')
 async def ping(ctx):
 	await ctx.send("pong", delete_after=1)
 	await ctx.message.delete()
@@ -178,7 +207,7 @@ async def ping(ctx):
 
 
 # Echo (don't tell steven)
-@bot.command(name='echo')
+@commands.command(name='echo')
 #@commands.check(is_approved)
 async def echo(ctx, *args):
 	msg = ' '.join(args)
@@ -190,7 +219,7 @@ async def echo(ctx, *args):
 
 
 # Purges a given number of messages
-@bot.command(name='purge')
+@commands.command(name='purge')
 async def purge(ctx, number):
 	await ctx.message.channel.purge(limit=int(number)+1)
 
@@ -200,11 +229,11 @@ async def purge(ctx, number):
 
 # Returns information about a specific option
 # Takes a ticker, date, type, and strike
-@bot.command(aliases=['option'])
+@commands.command(aliases=['option'])
 async def op(ctx, *args):
 	try:
 		t, d, o, s, st = mp.parseContractInfo(' '.join(args))
-		optionInfo = ou.getOptionInfo(st)
+		optionInfo = await ou.getOptionInfo(st)
 	except:
 		await ctx.send("String could not be parsed. Please check your formatting (`!help`) for more info")
 		raise ValueError("String could not be parsed")
@@ -231,6 +260,15 @@ async def op(ctx, *args):
 	embed.add_field(name="Bid / Ask", value="$" + str(round(optionInfo['bid'], 2)) + " / $" + str(round(optionInfo['ask'], 2)))
 	embed.add_field(name="B/A Spread", value="$" + str(round(round(optionInfo['ask'], 2) - round(optionInfo['bid'], 2), 2)))
 
+	# The greeks are a nice-to-have, so the rest of the info is still sent if they can't be calculated
+	try:
+		greeks = await ou.optionGreeks(t, d.timestamp(), o == "C", float(s), optionInfo['impliedVolatility'])
+		embed.add_field(name="Theo. Value", value="$" + str(round(greeks['value'], 2)))
+		embed.add_field(name="Delta / Gamma", value="{0} / {1}".format(round(greeks['delta'], 3), round(greeks['gamma'], 3)))
+		embed.add_field(name="Theta / Vega", value="{0} / {1}".format(round(greeks['theta'], 3), round(greeks['vega'], 3)))
+	except (ValueError, KeyError):
+		pass
+
 	embed.set_footer(text="Data requested at " + datetime.today().strftime('%H:%M:%S (%m/%m/%y)') + 
 		"\nData may not be accurate as of the time requested due to API delay")
 
@@ -241,7 +279,7 @@ async def op(ctx, *args):
 
 # Returns an option chain
 # Takes a ticker and (optionally) a date
-@bot.command(aliases=["opc", "optionchain"])
+@commands.command(aliases=["opc", "optionchain"])
 async def ops(ctx, *args):
 	string = ' '.join(args)
 
@@ -258,13 +296,13 @@ async def ops(ctx, *args):
 	try:
 		# If we're not given a date:
 		if date == None:
-			embed.add_field(name="Availible Dates", value = ou.getChainDates(ticker))
+			embed.add_field(name="Availible Dates", value = await ou.getChainDates(ticker))
 			embed.add_field(name="More Info", value="To search more specifically, use `!ops ticker date`", inline=False)
 		# Else, we have a date : try to get the info
 		else:
-			values, strikes = ou.printChain(ticker, int(date.timestamp()))
-			for i in range(0, len(values)-1):
-				embed.add_field(name = strikes[i], value=values[i], inline=False)
+			values, strikes = await ou.printChain(ticker, int(date.timestamp()))
+			for strike, value in zip(strikes, values):
+				embed.add_field(name = strike, value=value, inline=False)
 	except:
 		await ctx.send("No data found. Please check the formatting, ticker spelling, and date")
 		raise ValueError("No data found for input")
@@ -274,18 +312,20 @@ async def ops(ctx, *args):
 
 
 # Charts an options contract
-@bot.command(aliases=['chart'])
+@commands.command(aliases=['chart'])
 async def c(ctx, *args):
 	string = ' '.join(args)
 	string = string.upper()
 
 	try:
 		await ctx.send("Compiling data....", delete_after=1.0)
-		length, optionInfo = ou.getChartInfo(string)
+		length, optionInfo = await ou.getChartInfo(string)
 
-		chart = gc.Chart(string, optionInfo['underlyingSymbol'], length)
-		file = discord.File(chart.name)
+		png = await gc.generateChart(string, optionInfo['underlyingSymbol'], length)
+		file = discord.File(io.BytesIO(png), filename=optionInfo['underlyingSymbol'] + ".png")
 		await ctx.message.channel.send("Change in Price (and Volume)", file=file)
+	except gc.ChartQueueFull:
+		await ctx.send("Too many charts are being drawn right now - please try again in a few seconds")
 	except:
 		await ctx.send("No data was found. This has two main causes:\n"
 			"Check if the option exists using `!op`. It might just exist. Alternativly, it might be a formatting issue\n"
@@ -299,7 +339,7 @@ async def c(ctx, *args):
 
 # Charts a stock
 # Takes a ticker and a duration
-@bot.command(aliases=['chartstock'])
+@commands.command(aliases=['chartstock'])
 async def cs(ctx, *args):
 
 	try:
@@ -325,10 +365,12 @@ async def cs(ctx, *args):
 	# Tries generating the chart
 	try:
 		await ctx.send("Compiling data....", delete_after=1.0)
-		chart = gc.Chart(ticker, ticker.upper(), length, interval=interval)
-		file = discord.File(chart.name)
+		png = await gc.generateChart(ticker, ticker.upper(), length, interval=interval)
+		file = discord.File(io.BytesIO(png), filename=ticker.upper() + ".png")
 		# Sends the chart (if sucessful)
 		await ctx.message.channel.send("Price and Volume Changes", file=file)
+	except gc.ChartQueueFull:
+		await ctx.send("Too many charts are being drawn right now - please try again in a few seconds")
 	except:
 		await ctx.send("No data found. Is the ticker spelled correctly?\nThis may happen due to interval lengths - "
 			"the specified interval may be too small (for example, if you call 1D over the weekend, the day would "
@@ -340,32 +382,23 @@ async def cs(ctx, *args):
 #############
 ## ECONOMY ##
 #############
-class jFile:
-	def __init__(self, fileName):
-		# Check if valid file
-		if os.path.isfile(fileName):
-			try:
-				with open(fileName) as f:
-					data = json.load(f)
-				
-				self.fileName = fileName
-				self.data = data
-			except:
-				raise ValueError("Could not load data from json file")
-		else:
-			os.mknod(fileName)
-			self.fileName = fileName
-			self.data = {}
-	# Saves the json file 
-	def save(self):
-		with open(self.fileName, "w") as f:
-			json.dump(self.data, f, indent=4, sort_keys=True)
+# Each user is saved on their own (in a transaction), rather than rewriting everything on every command
+# Commands only mark users as changed - the changes are written in batches by currency.flushLoop
+# (Opened by main - see openLedger)
+currency = None
+
 
 
 
-currency=jFile('currency.json')
-if 'name' not in currency.data:
-	currency.data['name']='USD'
+# openLedger()
+# Opens the ledger, and migrates everyone's stocks and options into position maps
+def openLedger():
+	ledger = Ledger('currency.db', importFrom='currency.json')
+	if 'name' not in ledger.data:
+		ledger.data['name']='USD'
+		ledger.save('name')
+	trading.migrate(ledger)
+	return ledger
 
 
 
@@ -376,21 +409,21 @@ def check_id(ID):
 	if ID not in currency.data:
 		currency.data[ID] = {}
 		currency.data[ID]['currency'] = 0
-		currency.data[ID]['symbols'] = []
-		currency.data[ID]['stocks'] = []
-		currency.save() 
+		currency.data[ID]['symbols'] = {}
+		currency.data[ID]['stocks'] = {}
+		currency.markDirty(ID)
 
 
 
 # Admin use only:
 # Adds a given number of dollars to a user's account
 @commands.check(is_approved)
-@bot.command(pass_context=True)
+@commands.command(pass_context=True)
 async def add(ctx,amount:int=0,member:discord.Member=None):
 	ID = str(member.id)
 	check_id(ID)
 	currency.data[ID]['currency'] += amount
-	currency.save()
+	currency.markDirty(ID)
 	await ctx.send("The Fed just gave {1} another ${0} bailout".format(amount, member.mention))
 
 
@@ -399,26 +432,59 @@ async def add(ctx,amount:int=0,member:discord.Member=None):
 # Admin use only:
 # Remives a given number of points from a member's stash
 @commands.check(is_approved)
-@bot.command(pass_context=True)
+@commands.command(pass_context=True)
 async def remove(ctx,amount:int=0,member:discord.Member=None):
 	''': Remove points/currency from a member's stash'''
 	ID = str(member.id)
 	check_id(ID)
 	currency.data[ID]['currency'] = max(currency.data[ID]['currency'] - amount, 0)
-	currency.save()
+	currency.markDirty(ID)
 	await ctx.send("{0} just lost ${1} on OTM SPY puts".format(member.mention, amount))
 
 
 
 
 
+# Returns the IDs of everyone with a portfolio
+def memberIDs():
+	return [ID for ID in currency.data if ID != 'name']
+
+
+
+
+# Keeps the quotes for everything held (or recently looked up) warm, so portfolio commands rarely wait on Yahoo
+refresher = MarketRefresher(lambda: heldSymbols(memberIDs()))
+
+
+
+
+# Returns every stock and (unexpired) contract symbol held by the given members
+# With underlyings, the tickers the contracts are for are included too
+def heldSymbols(IDs, underlyings=False):
+	symbols = set()
+	for ID in IDs:
+		symbols.update(currency.data[ID]['stocks'])
+		contracts = [mp.Contract.fromSymbol(symbol) for symbol in currency.data[ID]['symbols']]
+		contracts = [contract for contract in contracts if not contract.isExpired()]
+		symbols.update(contract.symbol for contract in contracts)
+		if underlyings:
+			symbols.update(contract.ticker for contract in contracts)
+	return symbols
+
+
+
+
 # Checks a member's portfolio by ID
-async def memberPortfolio(id):
+# quotes is an (optional) snapshot from ou.getQuotes - if it's not given, the member's holdings are fetched
+async def memberPortfolio(id, quotes=None):
 	ID = str(id)
 	check_id(ID)
 
-	optionValue, change, percentChange = ou.optionsPortfolioValue(currency.data[ID]['symbols'])
-	stockValue, stockChange, stockPercentChange = ou.stocksPortfolioValue(currency.data[ID]['stocks'])
+	if quotes is None:
+		quotes = await ou.getQuotes(heldSymbols([ID]))
+
+	optionValue, change, percentChange = await ou.optionsPortfolioValue(currency.data[ID]['symbols'], quotes)
+	stockValue, stockChange, stockPercentChange = await ou.stocksPortfolioValue(currency.data[ID]['stocks'], quotes)
 
 	totalValue = round(optionValue + stockValue + currency.data[ID]['currency'], 2)
 	totalChange = round(change + stockChange, 2)
@@ -430,14 +496,18 @@ async def memberPortfolio(id):
 
 
 # Checks your portfolio value
-@bot.command(pass_context=True)
+@commands.command(pass_context=True)
 async def portfolio(ctx):
 	ID = str(ctx.message.author.id)
-	value, change, percentChange, optionValue, stockValue = await memberPortfolio(ID)
+	check_id(ID)
+	quotes = await ou.getQuotes(heldSymbols([ID], underlyings=True)) # The underlyings are needed for the delta
+	value, change, percentChange, optionValue, stockValue = await memberPortfolio(ID, quotes)
+	delta = ou.portfolioDelta(currency.data[ID]['stocks'], currency.data[ID]['symbols'], quotes)
 
 	await ctx.send(("your broke ass only has ${0} (Change: ${1} / {2}%)\n"
 		"Investing power: ${3}\nOptions: ${4}\n"
-		"Stocks: ${5}").format(value, change, percentChange, currency.data[ID]['currency'], optionValue, stockValue))
+		"Stocks: ${5}\nDelta: ${6}").format(value, change, percentChange, currency.data[ID]['currency'], optionValue,
+		stockValue, delta))
 	
 	if str(ctx.message.author.id) == "160507791059058688":
 		await ctx.send("Steven?: true\nSimp?: true\nHotel?: Trivago")
@@ -447,14 +517,17 @@ async def portfolio(ctx):
 
 
 # Views the server leaderboard
-@bot.command(aliases=['leaderboards'])
+@commands.command(aliases=['leaderboards'])
 async def leaderboard(ctx):
+	IDs = memberIDs()
+
+	# Prices every distinct symbol once, then values all the portfolios from that snapshot
+	quotes = await ou.getQuotes(heldSymbols(IDs))
 
 	members = []
-	for ID, assets in currency.data.items():
-		if ID != 'name':
-			totalValue, *trash = await memberPortfolio(ID)
-			members.append((ID, totalValue))
+	for ID in IDs:
+		totalValue, *trash = await memberPortfolio(ID, quotes)
+		members.append((ID, totalValue))
 
 	if len(members) == 0:
 		return await ctx.send('Leaderboard is empty')
@@ -474,65 +547,63 @@ async def leaderboard(ctx):
 
 
 
-# validPurchase (float currentLiquid, float price)
-# Checks if this is a valid purchase
-async def validPurchase(currentLiquid, price):
-	if currentLiquid > price:
-		return True
-	else:
-		await ctx.send("broke ass (you need ${0} to buy this)".format(price))
-		return
+# Buys the given amount of the given stock/contract
+@commands.command(pass_context=True)
+async def buy(ctx, *args):
+	contractArgs = list(args)[:-1]
+	ID = str(ctx.message.author.id)
+	check_id(ID)
 
-# buySymbol(data, list contractArgs, int numberOfContracts)
-# buys the given symbol
-async def buySymbol(data, *args):
-	args = list(args)
 	try:
-		contractArgs, numberOfContracts = args[:-1][0], args[-1]
+		await trading.placeOrder(currency, ID, contractArgs, int(args[-1]), trading.buySymbol)
+	except trading.OrderRejected as e:
+		return await ctx.send("broke ass (you need ${0} to buy this)".format(e.order[-1]))
 	except:
-		raise ValueError("Input improperly formatted")
-
-	currentLiquid = data['currency']
-
-	if len(contractArgs) == 1: # this is a stock
-		info = ou.getStockInfo(contractArgs[0])
-		symbol, price = info['symbol'], info['regularMarketPrice']
-
-		if validPurchase(currentLiquid, price):
-			data['stocks'].append([symbol, numberOfContracts])
-
-	elif len(contractArgs) == 3: # this is an option
-		t, d, o, s, symbol = mp.parseContractInfo(' '.join(contractArgs))
-		price = ou.getOptionInfo(symbol)['lastPrice']
+		await ctx.send("Please check formatting (`!help`)")
+		raise ValueError("Please check formatting (`!help`)")
 
-		if validPurchase(currentLiquid, price):
-			data['symbols'].append([symbol, numberOfContracts])
+	await ctx.send("Purchase sucessful")
 
-	else:
-		return await ctx.send("Please check formatting (`!help`)")
-		raise ValueError("Please check formatting (`!help`)")
 
-	data['currency'] -= price
-	return data
 
 
-# Buys the given amount of the given stock/contract
-@bot.command(pass_context=True)
-async def buy(ctx, *args):
+# Sells the given amount of the given stock/contract
+@commands.command(pass_context=True)
+async def sell(ctx, *args):
 	contractArgs = list(args)[:-1]
 	ID = str(ctx.message.author.id)
 	check_id(ID)
-	
+
 	try:
-		data = await buySymbol(currency.data[ID], contractArgs, int(args[-1]))
-		currency.data[ID] = data
+		order = await trading.placeOrder(currency, ID, contractArgs, int(args[-1]), trading.sellSymbol)
+	except trading.OrderRejected as e:
+		return await ctx.send("You don't have {0} of {1} to sell".format(e.order[2], e.order[1]))
 	except:
 		await ctx.send("Please check formatting (`!help`)")
 		raise ValueError("Please check formatting (`!help`)")
-	
-	currency.save()
-	await ctx.send("Purchase sucessful")
+
+	await ctx.send("Sold for ${0}".format(order[-1]))
+
+
+
+
+
+# main()
+# Loads the env file (contains the token), opens the ledger and runs the bot
+def main():
+	global TOKEN, BOT_ADMIN_ID, TIMEOUT_CHANNEL, CANNOT_BE_TIMEOUTED, currency, bot, client
+	load_dotenv()
+	TOKEN = os.getenv('DISCORD_TOKEN')
+	BOT_ADMIN_ID = os.getenv('BOT_ADMIN')
+	TIMEOUT_CHANNEL = int(os.getenv("TIMEOUT_CHANNEL"))
+	CANNOT_BE_TIMEOUTED = [str(BOT_ADMIN_ID), "201503408652419073", "285480424904327179"]
+
+	currency = openLedger()
+	bot, client = initialize()
+	bot.run(TOKEN)
+	client.run(TOKEN)
 
 # Execute #
-bot.run(TOKEN)
-client.run(TOKEN)
+# (Guarded, so the chart worker processes can import this module without starting the bot)
+if __name__ == "__main__":
+	main()